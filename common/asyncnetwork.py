@@ -0,0 +1,167 @@
+# stdlib imports
+import asyncio
+import time
+
+# vendor imports
+import click
+
+# local imports
+from common.intcode import IntCodeMachine, IntCodeMachineState
+from common.samples import buildTopology, relayProgram, runPolling
+
+
+class AsyncIntCodeMachine:
+    """IntCode machine that awaits its input from an asyncio queue
+
+    Every output value is delivered to the inbox of each downstream machine.
+    """
+
+    def __init__(self, machine, network):
+        self.machine = machine
+        self.network = network
+
+        # Queue of incoming values and the machines outputs are sent to
+        self.inbox = asyncio.Queue()
+        self.downstream = []
+
+        # Whether the machine is blocked on an empty inbox
+        self.waiting = False
+
+    def deliver(self, value):
+        """Put a value in the inbox, waking the machine if it's blocked"""
+        self.inbox.put_nowait(value)
+        if self.waiting:
+            self.waiting = False
+            self.network.waitingCount -= 1
+
+    async def run(self):
+        network = self.network
+        inbox = self.inbox
+        downstream = self.downstream
+
+        # Drive the machine's generator until it halts
+        program = self.machine.run()
+        try:
+            value = next(program)
+            while True:
+                # Pass output values on downstream
+                if value is not IntCodeMachineState.WAITING_FOR_INPUT:
+                    for node in downstream:
+                        node.deliver(value)
+                    value = next(program)
+                    continue
+
+                # Wait for input, letting the network know when nothing at
+                # all can make progress
+                if inbox.empty():
+                    self.waiting = True
+                    network.waitingCount += 1
+                    network.checkIdle()
+                value = program.send(await inbox.get())
+        except StopIteration:
+            pass
+
+        # This machine no longer counts towards the running total
+        network.runningCount -= 1
+        network.checkIdle()
+
+
+class IntCodeNetwork:
+    """Set of IntCode machines wired together by asyncio queues"""
+
+    def __init__(self):
+        self.nodes = []
+        self.runningCount = 0
+        self.waitingCount = 0
+        self.idle = None
+
+    def add(self, machine):
+        """Add an IntCodeMachine to the network and return its node"""
+        node = AsyncIntCodeMachine(machine, self)
+        self.nodes.append(node)
+        return node
+
+    def connect(self, source, destination):
+        """Send the outputs of one node to the inbox of another"""
+        source.downstream.append(destination)
+
+    def checkIdle(self):
+        # Idle once every machine still running is blocked on an empty inbox
+        if self.waitingCount == self.runningCount:
+            self.idle.set()
+
+    async def run(self):
+        """Run every node until they all halt or the network goes idle
+
+        Returns True if every machine halted, or False if the remaining
+        machines were all stuck waiting for input.
+        """
+        self.idle = asyncio.Event()
+        self.runningCount = len(self.nodes)
+        self.waitingCount = 0
+
+        # Run all the machines and wait for them to finish or stall
+        tasks = [asyncio.ensure_future(node.run()) for node in self.nodes]
+        finished = asyncio.gather(*tasks)
+        idleTask = asyncio.ensure_future(self.idle.wait())
+        await asyncio.wait(
+            [finished, idleTask], return_when=asyncio.FIRST_COMPLETED
+        )
+
+        # Let any error from a machine propagate
+        if finished.done():
+            finished.result()
+
+        # Cancel whatever is still blocked
+        for task in tasks + [idleTask]:
+            task.cancel()
+        await asyncio.gather(finished, idleTask, return_exceptions=True)
+
+        return self.runningCount == 0
+
+
+def runAsync(program, size, links, seeds):
+    # Build the network and seed the inboxes
+    network = IntCodeNetwork()
+    nodes = [network.add(IntCodeMachine(program)) for i in range(size)]
+    for source, destination in links:
+        network.connect(nodes[source], nodes[destination])
+    for i, count in seeds.items():
+        for j in range(count):
+            nodes[i].deliver(0)
+
+    return asyncio.run(network.run())
+
+
+@click.command()
+@click.option(
+    "--topology", type=click.Choice(["ring", "mesh"]), default="ring"
+)
+@click.option("--machines", "-n", default=400)
+@click.option("--rounds", "-r", default=50)
+@click.option("--tokens", "-t", default=1)
+def main(topology, machines, rounds, tokens):
+    """Compare the asyncio network against round-robin polling"""
+    links, fanIn = buildTopology(topology, machines)
+    size = max(max(link) for link in links) + 1
+    program = relayProgram(fanIn, rounds)
+
+    # A ring passes `tokens` values around, a mesh needs every inbox full
+    if topology == "ring":
+        seeds = {i * size // tokens: 1 for i in range(tokens)}
+    else:
+        seeds = {i: fanIn for i in range(size)}
+
+    for name, runner in [("asyncio", runAsync), ("polling", runPolling)]:
+        start = time.perf_counter()
+        halted = runner(program, size, links, seeds)
+        elapsed = time.perf_counter() - start
+        print(
+            f"{name}: {size} machines, {elapsed:.3f}s,",
+            "halted" if halted else "stalled",
+        )
+
+
+# Execute cli function on main
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,253 @@
+# stdlib imports
+import collections
+import importlib
+import itertools
+import time
+import tracemalloc
+
+# vendor imports
+import click
+
+# local imports
+from common.compiler import CompiledIntCodeMachine
+from common.intcode import IntCodeMachine, IntCodeMachineState
+from common.jit import JitIntCodeMachine
+from common.memorybenchmark import scatterAddresses, scatterProgram
+from common.profiler import ProfiledIntCodeMachine
+from common.samples import (
+    echoProgram,
+    fibonacciProgram,
+    loopProgram,
+    selfModifyingProgram,
+)
+
+# Engines that can be benchmarked by name, and anything else can be given as
+# module:Class
+engines = {
+    "interpreter": IntCodeMachine,
+    "compiled": CompiledIntCodeMachine,
+    "jit": JitIntCodeMachine,
+}
+
+
+def runMachine(engine, program, inputValues=()):
+    # Run a single machine over some input until it stops
+    machine = engine(program)
+    machine.feed(inputValues)
+    machine.execute()
+    return [machine]
+
+
+def loopWorkload(engine, program):
+    return runMachine(engine, loopProgram, [100000])
+
+
+def recursionWorkload(engine, program):
+    return runMachine(engine, fibonacciProgram, [18])
+
+
+def ioWorkload(engine, program):
+    return runMachine(engine, echoProgram, range(50000))
+
+
+def selfModifyingWorkload(engine, program):
+    return runMachine(engine, selfModifyingProgram, [20000])
+
+
+def sparseWorkload(engine, program):
+    return runMachine(engine, scatterProgram, scatterAddresses(5000, 1 << 40))
+
+
+def day02Workload(engine, program):
+    # Try every noun and verb on one machine, resetting it between runs
+    machine = engine(program)
+    executed = 0
+    for noun, verb in itertools.product(range(100), repeat=2):
+        machine.reset()
+        machine.memory[1] = noun
+        machine.memory[2] = verb
+        machine.execute()
+        executed += machine.instructionCount
+
+    # Count the instructions of every run rather than just the last
+    machine.instructionCount = executed
+    return [machine]
+
+
+def day05Workload(engine, program):
+    # Run both the air conditioner and thermal radiator diagnostics
+    return runMachine(engine, program, [1]) + runMachine(engine, program, [5])
+
+
+def day07Workload(engine, program):
+    # Run every feedback loop of amplifiers
+    machines = []
+    for permutation in itertools.permutations(range(5, 10)):
+        amplifiers = [engine(program) for phase in permutation]
+        for machine, phase in zip(amplifiers, permutation):
+            machine.feed([phase])
+
+        signals = [0]
+        while amplifiers[-1].state is not IntCodeMachineState.HALTED:
+            for machine in amplifiers:
+                machine.feed(signals)
+                machine.execute()
+                signals = machine.drain()
+        machines += amplifiers
+    return machines
+
+
+def day09Workload(engine, program):
+    # Run BOOST in sensor boost mode
+    return runMachine(engine, program, [2])
+
+
+def day11Workload(engine, program):
+    # Drive the painting robot around the hull until it halts
+    machine = engine(program)
+    colors = collections.defaultdict(int)
+    x, y, dx, dy = 0, 0, 0, 1
+    while machine.state is not IntCodeMachineState.HALTED:
+        machine.feed([colors[(x, y)]])
+        machine.execute()
+        for color, turn in zip(*[iter(machine.drain())] * 2):
+            colors[(x, y)] = color
+            dx, dy = (dy, -dx) if turn else (-dy, dx)
+            x, y = x + dx, y + dy
+    return [machine]
+
+
+def day13Workload(engine, program):
+    # Play the arcade game for free, with the paddle following the ball
+    machine = engine(program)
+    machine.memory[0] = 2
+    ballX = paddleX = 0
+    while True:
+        machine.execute()
+        outputs = machine.drain()
+        for x, y, tile in zip(*[iter(outputs)] * 3):
+            if tile == 4:
+                ballX = x
+            elif tile == 3:
+                paddleX = x
+        if machine.state is IntCodeMachineState.HALTED:
+            return [machine]
+        machine.feed([(ballX > paddleX) - (ballX < paddleX)])
+
+
+# Workloads that run on their own, and those that replay a puzzle input
+syntheticWorkloads = {
+    "loop": loopWorkload,
+    "recursion": recursionWorkload,
+    "io": ioWorkload,
+    "selfmodifying": selfModifyingWorkload,
+    "sparse": sparseWorkload,
+}
+puzzleWorkloads = {
+    "day02": day02Workload,
+    "day05": day05Workload,
+    "day07": day07Workload,
+    "day09": day09Workload,
+    "day11": day11Workload,
+    "day13": day13Workload,
+}
+
+
+def loadEngine(name):
+    """Look up an engine by name, or import it from module:Class"""
+    if name in engines:
+        return engines[name]
+    moduleName, className = name.split(":")
+    return getattr(importlib.import_module(moduleName), className)
+
+
+def countInstructions(workload, program):
+    # The profiler counts instructions the same whichever engine runs them
+    machines = workload(ProfiledIntCodeMachine, program)
+    return sum(machine.instructionCount for machine in machines)
+
+
+def percentile(values, fraction):
+    # Nearest rank percentile of some values
+    values = sorted(values)
+    return values[min(int(fraction * len(values)), len(values) - 1)]
+
+
+def measure(workload, program, engine, repeats):
+    """Time repeated runs of a workload, returning the times taken and the
+    peak memory allocated in a separate traced run
+    """
+    times = []
+    for i in range(repeats):
+        start = time.perf_counter()
+        workload(engine, program)
+        times.append(time.perf_counter() - start)
+
+    # Tracing slows everything down, so peak memory gets a run of its own
+    tracemalloc.start()
+    workload(engine, program)
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return times, peak
+
+
+@click.command()
+@click.option(
+    "--engine",
+    "-e",
+    "engineNames",
+    multiple=True,
+    default=["interpreter", "compiled", "jit"],
+)
+@click.option(
+    "--workload",
+    "-w",
+    "workloadNames",
+    multiple=True,
+    type=click.Choice(list(syntheticWorkloads) + list(puzzleWorkloads)),
+)
+@click.option(
+    "--puzzle",
+    "-p",
+    "puzzleFiles",
+    multiple=True,
+    type=(click.Choice(list(puzzleWorkloads)), click.File("r")),
+    help="Puzzle input for a real workload, e.g. -p day09 input.txt",
+)
+@click.option("--repeats", "-r", default=5)
+def main(engineNames, workloadNames, puzzleFiles, repeats):
+    """Compare IntCode engines on synthetic and puzzle workloads"""
+    # Puzzle workloads run on the inputs given for them
+    programs = {name: file.read().strip() for name, file in puzzleFiles}
+    workloadNames = workloadNames or list(syntheticWorkloads) + list(programs)
+    loadedEngines = [(name, loadEngine(name)) for name in engineNames]
+    width = max(map(len, ["engine", *engineNames])) + 2
+
+    print(
+        f"{'workload':<14}{'engine':<{width}}{'instructions':>13}{'instr/s':>12}"
+        f"{'p50 ms':>10}{'p90 ms':>10}{'max ms':>10}{'peak KB':>10}"
+    )
+    for workloadName in workloadNames:
+        workload = {**syntheticWorkloads, **puzzleWorkloads}[workloadName]
+        if workloadName in puzzleWorkloads and workloadName not in programs:
+            raise click.UsageError(f"{workloadName} needs --puzzle input")
+        program = programs.get(workloadName)
+        instructions = countInstructions(workload, program)
+
+        for engineName, engine in loadedEngines:
+            times, peak = measure(workload, program, engine, repeats)
+            median = percentile(times, 0.5)
+            print(
+                f"{workloadName:<14}{engineName:<{width}}{instructions:>13}"
+                f"{instructions / median:>12.0f}"
+                f"{1e3 * median:>10.1f}"
+                f"{1e3 * percentile(times, 0.9):>10.1f}"
+                f"{1e3 * max(times):>10.1f}"
+                f"{peak / 1024:>10.0f}"
+            )
+
+
+# Execute cli function on main
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,201 @@
+# stdlib imports
+import array
+import hashlib
+import mmap
+import os
+import struct
+import sys
+import time
+
+# vendor imports
+import click
+
+# local imports
+from common.disassembler import ProgramAnalysis
+from common.intcode import PagedMemory, ProgramImage, pageSize
+
+# Magic number and version at the start of every binary image
+imageMagic = b"ICBI"
+imageVersion = 1
+
+# Magic, version, flags, data offset, length, region count and SHA-256 of
+# the program text, all little-endian
+headerFormat = struct.Struct("<4sHHqqq32s")
+
+# Each code region hint is a start and end address
+regionFormat = struct.Struct("<qq")
+
+# Values start on a boundary of this many bytes, so they can be mapped
+# straight into memory pages. They're stored as signed 64-bit integers, so
+# programs holding bigger values can't be compiled to an image, even though
+# machines can run them from text.
+dataAlignment = 4096
+
+# Set in the flags when the code region hints cover every instruction that
+# can run
+completeFlag = 1
+
+
+def programHash(values):
+    """Hash of a program, the same as the compiler uses for its cache"""
+    return hashlib.sha256(",".join(map(str, values)).encode())
+
+
+def codeRegions(analysis):
+    """Merge the reachable instructions of an analysis into address ranges"""
+    regions = []
+    for address in sorted(analysis.codeAddresses):
+        if regions and regions[-1][1] == address:
+            regions[-1][1] = address + 1
+        else:
+            regions.append([address, address + 1])
+    return [tuple(region) for region in regions]
+
+
+def writeImage(instructions, path):
+    """Compile comma-delimited program text into a binary image file
+
+    Raises a ValueError for a program holding a value too big for 64 bits.
+    """
+    try:
+        values = array.array(
+            "q", map(lambda op: int(op), instructions.strip().split(","))
+        )
+    except OverflowError:
+        raise ValueError(
+            "Binary images only hold 64-bit values, so programs with bigger "
+            "values have to be run from their text"
+        ) from None
+
+    # Hint at where the code is, from a static analysis of the program
+    analysis = ProgramAnalysis(values)
+    regions = codeRegions(analysis)
+    flags = completeFlag if analysis.complete else 0
+
+    # Pad the values out to whole pages, stored little-endian
+    values.extend(bytes(-len(values) % pageSize))
+    if sys.byteorder != "little":
+        values.byteswap()
+
+    headerLength = headerFormat.size + regionFormat.size * len(regions)
+    dataOffset = -(-headerLength // dataAlignment) * dataAlignment
+    header = headerFormat.pack(
+        imageMagic,
+        imageVersion,
+        flags,
+        dataOffset,
+        len(analysis.image),
+        len(regions),
+        programHash(analysis.image).digest(),
+    )
+
+    # Write to a temporary file first, so readers never see half an image
+    temporaryPath = f"{path}.{os.getpid()}.tmp"
+    with open(temporaryPath, "wb") as file:
+        file.write(header)
+        for region in regions:
+            file.write(regionFormat.pack(*region))
+        file.write(bytes(dataOffset - headerLength))
+        file.write(values.tobytes())
+    os.replace(temporaryPath, path)
+
+
+class BinaryProgramImage(ProgramImage):
+    """Program image whose pages are read-only views of a mapped file
+
+    Every process that opens the same file shares the same physical pages,
+    and machines created from the image copy a page only when they write
+    to it. Pickling the image just sends its path.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, "rb") as file:
+            self.mapping = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        # Check the header
+        (
+            magic,
+            version,
+            flags,
+            dataOffset,
+            length,
+            regionCount,
+            digest,
+        ) = headerFormat.unpack_from(self.mapping)
+        if magic != imageMagic or version != imageVersion:
+            raise ValueError(f"{path} is not a version {imageVersion} image")
+        self.hash = digest.hex()
+        self.complete = bool(flags & completeFlag)
+        self.codeRegions = [
+            regionFormat.unpack_from(
+                self.mapping, headerFormat.size + regionFormat.size * i
+            )
+            for i in range(regionCount)
+        ]
+
+        # Split the values into pages without copying them, unless they're
+        # in the wrong byte order for this machine
+        values = memoryview(self.mapping)[dataOffset:].cast("q")
+        if sys.byteorder != "little":
+            swapped = array.array("q", values)
+            swapped.byteswap()
+            values = memoryview(swapped).toreadonly()
+        pages = [
+            values[start : start + pageSize]
+            for start in range(0, len(values), pageSize)
+        ]
+
+        self.memory = PagedMemory()
+        self.memory.imageLength = length
+        self.memory.pages[:] = pages
+        self.pages = self.memory.share()
+
+    def __reduce__(self):
+        # Other processes map the file for themselves rather than being sent
+        # a copy of it
+        return (BinaryProgramImage, (self.path,))
+
+
+@click.group()
+def main():
+    """Compile IntCode programs to binary images"""
+
+
+@main.command("compile")
+@click.argument("input_file", type=click.File("r"))
+@click.argument("output_path", type=click.Path(dir_okay=False))
+def compileImage(input_file, output_path):
+    """Compile a program's text into a binary image"""
+    try:
+        writeImage(input_file.read(), output_path)
+    except ValueError as error:
+        raise click.ClickException(str(error))
+
+
+@main.command()
+@click.argument("image_path", type=click.Path(exists=True, dir_okay=False))
+@click.argument("text_file", type=click.File("r"), required=False)
+def info(image_path, text_file):
+    """Describe a binary image, comparing load time against its text"""
+    start = time.perf_counter()
+    image = BinaryProgramImage(image_path)
+    elapsed = time.perf_counter() - start
+
+    print(f"{len(image)} values, hash {image.hash}")
+    print(
+        f"{len(image.codeRegions)} code regions,",
+        "complete" if image.complete else "incomplete",
+    )
+    print(f"mapped in {1e6 * elapsed:.1f}us")
+
+    if text_file is not None:
+        text = text_file.read()
+        start = time.perf_counter()
+        ProgramImage(text)
+        print(f"parsed in {1e6 * (time.perf_counter() - start):.1f}us")
+
+
+# Execute cli function on main
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,455 @@
+# stdlib imports
+import collections
+import hashlib
+import os
+
+# local imports
+from common.intcode import (
+    IntCodeMachine,
+    IntCodeMachineState,
+    cacheDirectory,
+    decodeTable,
+    pageMask,
+    pageShift,
+    parameterCounts,
+)
+
+# Bumped whenever the generated code changes, to ignore stale cache entries
+cacheVersion = 7
+
+# Compiled programs already loaded by this process, keyed by hash, in least
+# to most recently used order
+loadedPrograms = collections.OrderedDict()
+maxLoadedPrograms = 32
+
+# Most bytes of compiled programs kept in the cache directory
+maxCacheBytes = 64 << 20
+
+# Opcodes that end a basic block
+jumpOpcodes = {5, 6}
+
+# Opcodes that are always left to the interpreter
+interpretedOpcodes = {3, 99}
+
+# Header of every generated module
+moduleHeader = """\
+# Generated from IntCode program {}
+blocks = dict()
+codeRegion = set()
+
+
+"""
+
+
+def readLines(param, mode, name):
+    """Python lines that read a parameter into `name`, and the expression
+    for its value
+    """
+    # Immediate mode is just the constant
+    if mode == 1:
+        return [], repr(param)
+
+    # A negative fixed address is left to the memory, which rejects it
+    if mode == 0 and param < 0:
+        return [f"{name} = memory[{param}]"], name
+
+    # Position mode reads a fixed address, relative mode reads an address
+    # offset from the relative base
+    if mode == 0:
+        lines = [f"_r = {param}"]
+    else:
+        lines = [
+            f"_r = relativeBase + {param}",
+            "if _r < 0:",
+            '    raise RuntimeError("Negative memory address")',
+        ]
+
+    # Read straight from the page, leaving anything past the last page to
+    # the memory itself
+    lines += [
+        "try:",
+        f"    {name} = pages[_r >> {pageShift}][_r & {pageMask}]",
+        "except IndexError:",
+        f"    {name} = memory[_r]",
+    ]
+    return lines, name
+
+
+def writeLines(param, mode, value, nextPosition):
+    """Python lines that write a value to a parameter's address"""
+    # A negative fixed address is left to the memory, which rejects it
+    if mode != 2 and param < 0:
+        return [f"memory[{param}] = {value}"]
+
+    # Determine the address to write to
+    if mode == 2:
+        lines = [
+            f"_w = relativeBase + {param}",
+            "if _w < 0:",
+            '    raise RuntimeError("Negative memory address")',
+        ]
+    else:
+        lines = [f"_w = {param}"]
+
+    # Write straight to the page, leaving allocation and copying of shared
+    # pages to the memory itself
+    lines += [
+        "try:",
+        f"    pages[_w >> {pageShift}][_w & {pageMask}] = {value}",
+        "except (IndexError, TypeError, OverflowError):",
+        f"    memory[_w] = {value}",
+    ]
+
+    # A write into the code region is reported back to the machine
+    lines += [
+        "if _w in codeRegion:",
+        "    machine.codeWritten(_w)",
+        f"    return {nextPosition}, relativeBase",
+    ]
+    return lines
+
+
+def decodeBlock(image, start):
+    """Decode the straight-line run of instructions starting at `start`"""
+    instructions = []
+    position = start
+    while position < len(image):
+        decoded = decodeTable.get(image[position])
+
+        # Unknown and interpreted opcodes end the block before them
+        if decoded is None or decoded[0] in interpretedOpcodes:
+            break
+
+        # Stop if the parameters run off the end of the image
+        end = position + 1 + parameterCounts[decoded[0]]
+        if end > len(image):
+            break
+
+        instructions.append((position, decoded, image[position + 1 : end]))
+        position = end
+
+        # Jumps end the block after them
+        if decoded[0] in jumpOpcodes:
+            break
+
+    return instructions, position
+
+
+def generateBlock(image, start):
+    """Generate the source of the function for the block at `start`"""
+    instructions, end = decodeBlock(image, start)
+    if not instructions:
+        return None, end
+
+    # A jump back to the start of the block becomes a loop
+    opcode, modeA, modeB, modeC = instructions[-1][1]
+    params = instructions[-1][2]
+    isLoop = opcode in jumpOpcodes and modeB == 1 and params[1] == start
+    indent = " " * 4
+
+    body = ["pages = memory.pages"]
+    loop = []
+    for position, (opcode, modeA, modeB, modeC), params in instructions:
+        nextPosition = position + 1 + parameterCounts[opcode]
+        lines, a = readLines(params[0], modeA, "_a")
+        loop += lines
+
+        # Arithmetic and comparisons all write their result
+        if opcode in (1, 2, 7, 8):
+            lines, b = readLines(params[1], modeB, "_b")
+            loop += lines
+            value = {
+                1: f"{a} + {b}",
+                2: f"{a} * {b}",
+                7: f"int({a} < {b})",
+                8: f"int({a} == {b})",
+            }[opcode]
+            loop += [f"_v = {value}"]
+            loop += writeLines(params[2], modeC, "_v", nextPosition)
+
+        # Output goes to the machine's consumers, or onto its output list
+        elif opcode == 4:
+            loop += [f"machine.emit({a})"]
+
+        # Relative base adjustment is kept in a local
+        elif opcode == 9:
+            loop += [f"relativeBase += {a}"]
+
+        # Conditional jumps end the block
+        elif opcode in jumpOpcodes:
+            test = f"{a} != 0" if opcode == 5 else f"{a} == 0"
+            if isLoop:
+                loop += [f"if {test}:", "    continue"]
+            else:
+                lines, b = readLines(params[1], modeB, "_b")
+                loop += [f"if {test}:"]
+                loop += [indent + line for line in lines]
+                loop += [f"    return {b}, relativeBase"]
+
+    loop += [f"return {end}, relativeBase"]
+
+    # Put the instructions inside an infinite loop if needed
+    if isLoop:
+        body += ["while True:"] + [indent + line for line in loop]
+    else:
+        body += loop
+
+    # Wrap the body into a function
+    lines = [f"def block_{start}(machine, memory, relativeBase):"]
+    lines += [indent + line for line in body]
+    return "\n".join(lines) + "\n", end
+
+
+def generateModuleBlock(image, start):
+    """Generate a block along with the lines registering it in the module"""
+    blockSource, end = generateBlock(image, start)
+    if blockSource is None:
+        return None
+    return blockSource + "\n".join(
+        [
+            f"blocks[{start}] = block_{start}",
+            f"codeRegion.update(range({start}, {end}))",
+            "",
+            "",
+        ]
+    )
+
+
+def findLeaders(image):
+    """Find the block leaders reachable from address 0"""
+    leaders = set()
+    pending = [0]
+    while pending:
+        start = pending.pop()
+        if start in leaders or not 0 <= start < len(image):
+            continue
+        leaders.add(start)
+        instructions, end = decodeBlock(image, start)
+
+        # Follow static jump targets and fall-through of conditional jumps
+        if instructions:
+            opcode, modeA, modeB, modeC = instructions[-1][1]
+            params = instructions[-1][2]
+            if opcode in jumpOpcodes:
+                if modeB == 1:
+                    pending.append(params[1])
+                pending.append(end)
+
+        # Step past an input instruction to the block that follows it
+        decoded = decodeTable.get(image[end]) if end < len(image) else None
+        if decoded is not None and decoded[0] == 3:
+            pending.append(end + 2)
+
+    return leaders
+
+
+class CompiledProgram:
+    def __init__(self, image):
+        # Keep a pristine copy of the image the program was compiled from
+        self.image = list(image)
+        self.hash = hashlib.sha256(
+            ",".join(map(str, image)).encode()
+        ).hexdigest()
+        self.path = cacheDirectory / f"{self.hash}.v{cacheVersion}.py"
+
+        # Namespace the generated functions live in
+        self.namespace = dict()
+
+        # Reuse the cached module if there is one, else compile from scratch
+        try:
+            self.source = self.path.read_text()
+            os.utime(self.path)
+        except OSError:
+            self.source = moduleHeader.format(self.hash)
+            for leader in sorted(findLeaders(self.image)):
+                blockSource = generateModuleBlock(self.image, leader)
+                if blockSource is not None:
+                    self.source += blockSource
+            self.save()
+        exec(compile(self.source, str(self.path), "exec"), self.namespace)
+
+        self.blocks = self.namespace["blocks"]
+        self.codeRegion = self.namespace["codeRegion"]
+
+    def save(self):
+        # Caching is best effort, so failing to write is not an error
+        try:
+            cacheDirectory.mkdir(parents=True, exist_ok=True)
+            temporaryPath = self.path.with_suffix(f".{os.getpid()}.tmp")
+            temporaryPath.write_text(self.source)
+            os.replace(temporaryPath, self.path)
+        except OSError:
+            return
+        evictCache()
+
+    def compileBlock(self, start):
+        # Generate the block and load it into the namespace
+        blockSource = generateModuleBlock(self.image, start)
+        if blockSource is None:
+            return None
+        exec(compile(blockSource, str(self.path), "exec"), self.namespace)
+
+        # Persist the block so later runs don't need to compile it again
+        self.source += blockSource
+        self.save()
+        return self.blocks[start]
+
+
+def evictCache():
+    """Delete the least recently used compiled programs from the cache
+    directory until they add up to at most `maxCacheBytes`
+
+    Some room is left so this doesn't delete files on every save.
+    """
+    files = []
+    for path in cacheDirectory.glob("*.py"):
+        try:
+            stat = path.stat()
+        except OSError:
+            continue
+        files.append((stat.st_mtime, stat.st_size, path))
+    files.sort()
+
+    cacheBytes = sum(size for mtime, size, path in files)
+    if cacheBytes <= maxCacheBytes:
+        return
+    for mtime, size, path in files:
+        if cacheBytes <= maxCacheBytes * 3 // 4:
+            break
+        try:
+            path.unlink()
+        except OSError:
+            continue
+        cacheBytes -= size
+
+
+def loadProgram(image):
+    """Get the compiled form of a program image, compiling it if needed
+
+    Only the most recently used programs are kept loaded, keyed by the hash
+    of the pristine image.
+    """
+    program = loadedPrograms.get(image.hash)
+    if program is None:
+        program = CompiledProgram(image.memory[: len(image)])
+    else:
+        loadedPrograms.move_to_end(image.hash)
+    loadedPrograms[image.hash] = program
+    if len(loadedPrograms) > maxLoadedPrograms:
+        loadedPrograms.popitem(last=False)
+    return program
+
+
+class CompiledIntCodeMachine(IntCodeMachine):
+    """IntCode machine that runs basic blocks compiled to Python functions
+
+    The program is compiled from its pristine image, so machines running it
+    with different data share the compiled code. Once the program's code is
+    patched, before or during a run, the machine falls back to the
+    interpreter.
+    Runs with an instruction budget are interpreted, and only those count
+    towards `instructionCount`.
+    """
+
+    # Writes into the code have to be seen, so the interpreter this falls
+    # back to can't run fused handlers
+    useFusions = False
+
+    def reset(self):
+        super().reset()
+
+        # Program is compiled on first execution
+        self.program = None
+        self.selfModified = False
+
+    def assignValue(self, address, mode, value):
+        super().assignValue(address, mode, value)
+
+        # Flag any interpreted write into the code region
+        if mode == 2:
+            address += self.relativeBase
+        if self.program is not None and address in self.program.codeRegion:
+            self.codeWritten(address)
+
+    def writeParam(self, offset, paramMode, value):
+        address = super().writeParam(offset, paramMode, value)
+
+        # Flag any interpreted write into the code region
+        if self.program is not None and address in self.program.codeRegion:
+            self.codeWritten(address)
+        return address
+
+    def patchedCode(self):
+        """Find an address of compiled code that differs from the image"""
+        # Pages still shared with the image can't have been patched
+        codeRegion = self.program.codeRegion
+        for index, (page, original) in enumerate(
+            zip(self.memory.pages, self.image.pages[0])
+        ):
+            if page is original:
+                continue
+            for offset, (value, originalValue) in enumerate(
+                zip(page, original)
+            ):
+                address = (index << pageShift) + offset
+                if value != originalValue and address in codeRegion:
+                    return address
+        return None
+
+    def codeWritten(self, address):
+        # Compiled code is no longer valid, so stop using it
+        self.selfModified = True
+
+    def execute(self, maxSteps=None):
+        # Compiled blocks can't be stopped part way, so a budgeted run is
+        # left to the interpreter
+        if maxSteps is not None:
+            return super().execute(maxSteps)
+
+        # Make surethe machine isn't already halted
+        if self.state is IntCodeMachineState.HALTED:
+            raise RuntimeError("Machine is already halted")
+
+        # Load the compiled program on first execution, and fall back to the
+        # interpreter if anything patched since the reset is part of its code
+        memory = self.memory
+        if self.program is None:
+            self.program = loadProgram(self.image)
+            address = self.patchedCode()
+            if address is not None:
+                self.codeWritten(address)
+        program = self.program
+        blocks = program.blocks
+        instructionTable = self.instructionTable
+
+        # Run compiled blocks until the program modifies its own code
+        while not self.selfModified:
+            block = blocks.get(self.position)
+
+            # Compile blocks reached by indirect jumps on demand, as long as
+            # the code there hasn't been overwritten since the start
+            if block is None:
+                start = self.position
+                instructions, end = decodeBlock(program.image, start)
+                if instructions:
+                    if memory[start:end] != program.image[start:end]:
+                        break
+                    block = program.compileBlock(start)
+
+            # Run the block if there is one
+            if block is not None:
+                self.position, self.relativeBase = block(
+                    self, memory, self.relativeBase
+                )
+                continue
+
+            # Else interpret a single instruction
+            decoded = instructionTable.get(memory[self.position])
+            if decoded is None:
+                break
+            handler, paramModeA, paramModeB, paramModeC = decoded
+            if handler(self, paramModeA, paramModeB, paramModeC):
+                return
+
+        # Leave everything else to the interpreter
+        super().execute()
@@ -0,0 +1,335 @@
+# stdlib imports
+import collections
+
+# vendor imports
+import click
+
+# local imports
+from common.intcode import decodeTable, opcodeNames, parameterCounts
+
+# Opcodes whose last param is an address they write to
+writingOpcodes = {1, 2, 3, 7, 8}
+
+# Conditional jumps
+jumpOpcodes = {5, 6}
+
+# A decoded instruction, with one (mode, param) pair per param
+Instruction = collections.namedtuple(
+    "Instruction", ["address", "opcode", "params"]
+)
+
+# A basic block, and the start addresses of the blocks that can follow it.
+# A successor of None means the block jumps somewhere that isn't known.
+Block = collections.namedtuple(
+    "Block", ["start", "end", "instructions", "successors"]
+)
+
+
+def decodeInstruction(image, address):
+    """Decode the instruction at `address`, or None if it isn't one"""
+    if not 0 <= address < len(image):
+        return None
+    decoded = decodeTable.get(image[address])
+    if decoded is None:
+        return None
+    opcode, *modes = decoded
+
+    # Params that run off the end of the image read as zero
+    count = parameterCounts[opcode]
+    params = list(image[address + 1 : address + 1 + count])
+    params += [0] * (count - len(params))
+    return Instruction(address, opcode, tuple(zip(modes, params)))
+
+
+def formatParam(mode, param):
+    # Positions are bracketed, immediates are bare, and relative addresses
+    # are offset from the relative base
+    if mode == 0:
+        return f"[{param}]"
+    elif mode == 1:
+        return str(param)
+    return f"[rb{param:+d}]"
+
+
+class ProgramAnalysis:
+    """Static analysis of an IntCode program image
+
+    Finds every instruction reachable from address 0, splits them into basic
+    blocks, and works out which memory can never change while the program
+    runs. A cell is only considered constant when it's outside the code, no
+    reachable instruction writes to it, and the analysis is complete: every
+    jump has a known target, nothing writes through the relative base, and
+    nothing writes over the code.
+    """
+
+    def __init__(self, image):
+        self.image = list(image)
+
+        # Reachable instructions by address, and the addresses they cover
+        self.instructions = dict()
+        self.codeAddresses = set()
+
+        # Addresses written to, and whether anything could write anywhere
+        self.writtenAddresses = set()
+        self.writesAnywhere = False
+
+        # Whether anything reads through the relative base, which could be
+        # a read of any cell, code included
+        self.readsAnywhere = False
+
+        # Addresses of jumps whose targets can't be worked out
+        self.unresolvedJumps = set()
+
+        self.findInstructions()
+        self.blocks = self.findBlocks()
+
+    @property
+    def selfModifying(self):
+        """Whether the program may write over its own code"""
+        return self.writesAnywhere or bool(
+            self.writtenAddresses & self.codeAddresses
+        )
+
+    @property
+    def complete(self):
+        """Whether the instructions found are exactly those that can run"""
+        return not self.unresolvedJumps and not self.selfModifying
+
+    def isConstant(self, address):
+        """Whether the cell at `address` provably keeps its initial value"""
+        return (
+            self.complete
+            and 0 <= address < len(self.image)
+            and address not in self.codeAddresses
+            and address not in self.writtenAddresses
+        )
+
+    def jumpTargets(self, instruction):
+        """Possible targets of a jump, with None for an unknown target"""
+        (modeA, paramA), (modeB, paramB) = instruction.params
+
+        # A jump with a constant condition only goes one way
+        condition = None
+        if modeA == 1:
+            condition = paramA
+        targets = []
+        if condition is None or (condition != 0) == (instruction.opcode == 5):
+            if modeB == 1:
+                targets.append(paramB)
+            elif modeB == 0 and 0 <= paramB < len(self.image):
+                # Resolved through the cell for now, and checked once every
+                # write is known
+                targets.append(self.image[paramB])
+            else:
+                targets.append(None)
+        if condition is None or (condition != 0) != (instruction.opcode == 5):
+            targets.append(instruction.address + 3)
+        return targets
+
+    def findInstructions(self):
+        # Follow every path through the program from address 0
+        pending = [0]
+        indirectJumps = []
+        while pending:
+            address = pending.pop()
+            if address in self.instructions:
+                continue
+            # Anything that isn't an instruction stops the machine
+            instruction = decodeInstruction(self.image, address)
+            if instruction is None:
+                continue
+            self.instructions[address] = instruction
+            self.codeAddresses.update(
+                range(address, address + 1 + len(instruction.params))
+            )
+
+            # Record where it writes, if it does
+            reads = instruction.params
+            if instruction.opcode in writingOpcodes:
+                mode, param = instruction.params[-1]
+                if mode == 2:
+                    self.writesAnywhere = True
+                else:
+                    self.writtenAddresses.add(param)
+                reads = reads[:-1]
+
+            # And whether it reads through the relative base
+            if any(mode == 2 for mode, param in reads):
+                self.readsAnywhere = True
+
+            # Work out where execution goes next
+            if instruction.opcode == 99:
+                continue
+            if instruction.opcode in jumpOpcodes:
+                for target in self.jumpTargets(instruction):
+                    if target is None:
+                        self.unresolvedJumps.add(address)
+                    else:
+                        pending.append(target)
+                if instruction.params[1][0] == 0:
+                    indirectJumps.append(instruction)
+            else:
+                pending.append(address + 1 + len(instruction.params))
+
+        # Jumps through a cell are only resolved if the cell is constant
+        for instruction in indirectJumps:
+            if not self.isConstant(instruction.params[1][1]):
+                self.unresolvedJumps.add(instruction.address)
+
+    def findBlocks(self):
+        # Blocks start at address 0, at jump targets and after jumps
+        leaders = {0}
+        for instruction in self.instructions.values():
+            if instruction.opcode in jumpOpcodes:
+                leaders.update(
+                    target
+                    for target in self.jumpTargets(instruction)
+                    if target is not None
+                )
+
+        blocks = dict()
+        for start in sorted(leaders & set(self.instructions)):
+            # Gather instructions until a jump, a halt or another leader
+            instructions = []
+            address = start
+            while address in self.instructions:
+                instruction = self.instructions[address]
+                instructions.append(instruction)
+                address += 1 + len(instruction.params)
+                if instruction.opcode in jumpOpcodes | {99} or (
+                    address in leaders
+                ):
+                    break
+
+            # Work out the blocks that can follow this one
+            last = instructions[-1]
+            if last.opcode == 99:
+                successors = []
+            elif last.opcode in jumpOpcodes:
+                successors = self.jumpTargets(last)
+                if last.address in self.unresolvedJumps:
+                    successors = [
+                        target for target in successors if target is not None
+                    ]
+                    successors.append(None)
+            else:
+                successors = [address]
+            blocks[start] = Block(start, address, instructions, successors)
+        return blocks
+
+    def listing(self):
+        """Disassembly of the whole image, one instruction or value a line"""
+        lines = []
+        address = 0
+        while address < len(self.image):
+            instruction = self.instructions.get(address)
+
+            # Cells that aren't reachable code are listed as plain values
+            if instruction is None:
+                note = "  ; never executed" if self.complete else ""
+                lines.append(
+                    f"{address:>6}: {self.image[address]:<24} data{note}"
+                )
+                address += 1
+                continue
+
+            # Reachable instructions are listed with their raw words
+            end = address + 1 + len(instruction.params)
+            words = ",".join(map(str, self.image[address:end]))
+            operands = ", ".join(
+                formatParam(mode, param) for mode, param in instruction.params
+            )
+            label = ">" if address in self.blocks else " "
+            lines.append(
+                f"{address:>6}:{label}{words:<24} "
+                f"{opcodeNames[instruction.opcode]:<5}{operands}"
+            )
+            address = end
+        return "\n".join(lines)
+
+    def graph(self):
+        """Control-flow graph of the blocks, one block a line"""
+        lines = []
+        for block in self.blocks.values():
+            successors = ", ".join(
+                "?" if target is None else str(target)
+                for target in block.successors
+            )
+            lines.append(
+                f"{block.start:>6}-{block.end - 1:<6} -> "
+                f"{successors or 'halt'}"
+            )
+        return "\n".join(lines)
+
+    def optimize(self):
+        """Rewrite the image with constant operands folded into immediates
+
+        Returns the new image and the number of operands folded. The image
+        is only rewritten when every instruction that can run is known and
+        nothing reads through the relative base, and instructions whose words
+        are themselves read as data are left alone.
+        """
+        image = list(self.image)
+        if not self.complete or self.readsAnywhere:
+            return image, 0
+
+        # Code that the program reads as data has to stay as it is
+        codeReads = set()
+        for instruction in self.instructions.values():
+            for mode, param in instruction.params:
+                if mode == 0 and param in self.codeAddresses:
+                    codeReads.add(param)
+
+        folded = 0
+        for address, instruction in self.instructions.items():
+            end = address + 1 + len(instruction.params)
+            if codeReads.intersection(range(address, end)):
+                continue
+
+            # Fold every read from a constant cell into an immediate
+            params = instruction.params
+            if instruction.opcode in writingOpcodes:
+                params = params[:-1]
+            for i, (mode, param) in enumerate(params):
+                if mode == 0 and self.isConstant(param):
+                    image[address + 1 + i] = self.image[param]
+                    image[address] += 100 * 10**i
+                    folded += 1
+        return image, folded
+
+
+@click.command()
+@click.argument("input_file", type=click.File("r"))
+@click.option("--graph", "-g", is_flag=True, help="Show the control flow")
+@click.option("--optimize", "-o", "outputFile", type=click.File("w"))
+def main(input_file, graph, outputFile):
+    """Disassemble an IntCode program, and optionally optimize it"""
+    analysis = ProgramAnalysis(
+        map(lambda op: int(op), input_file.read().strip().split(","))
+    )
+
+    print(analysis.graph() if graph else analysis.listing())
+
+    # Explain why the analysis is incomplete, if it is
+    if analysis.unresolvedJumps:
+        print("Unresolved jumps at:", sorted(analysis.unresolvedJumps))
+    if analysis.writesAnywhere:
+        print("Writes through the relative base, possibly over its code")
+    elif analysis.selfModifying:
+        print(
+            "Writes over its own code at:",
+            sorted(analysis.writtenAddresses & analysis.codeAddresses),
+        )
+
+    # Write the optimized image out alongside the listing
+    if outputFile is not None:
+        image, folded = analysis.optimize()
+        outputFile.write(",".join(map(str, image)) + "\n")
+        if analysis.complete and analysis.readsAnywhere:
+            print("Not optimized, as it reads through the relative base")
+        print(f"Folded {folded} operands into immediates")
+
+
+# Execute cli function on main
+if __name__ == "__main__":
+    main()
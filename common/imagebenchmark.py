@@ -0,0 +1,53 @@
+# stdlib imports
+import random
+import time
+
+# vendor imports
+import click
+
+# local imports
+from common.intcode import IntCodeMachine, ProgramImage
+
+
+def timePerCall(function, count):
+    # Average time of a call, in microseconds
+    start = time.perf_counter()
+    for i in range(count):
+        function()
+    return 1e6 * (time.perf_counter() - start) / count
+
+
+@click.command()
+@click.option("--count", "-n", default=2000)
+def main(count):
+    """Measure the cost of creating and resetting IntCode machines"""
+    generator = random.Random(0)
+    for size in (500, 5000, 50000):
+        text = ",".join(str(generator.randrange(100000)) for i in range(size))
+        image = ProgramImage(text)
+        machine = IntCodeMachine(image)
+
+        # Parsing the text for every machine, as every machine used to
+        parse = timePerCall(lambda: IntCodeMachine(ProgramImage(text)), count)
+
+        # Sharing the pages of an image parsed once
+        share = timePerCall(lambda: IntCodeMachine(image), count)
+
+        # Putting a machine that has written to every page back to the image
+        def dirtyReset():
+            for address in range(0, size, 1024):
+                machine.memory[address] = 1
+            machine.reset()
+
+        reset = timePerCall(dirtyReset, count)
+
+        print(
+            f"{size} values: parse {parse:.1f}us,",
+            f"from image {share:.1f}us,",
+            f"reset {reset:.1f}us",
+        )
+
+
+# Execute cli function on main
+if __name__ == "__main__":
+    main()
@@ -1,56 +1,695 @@
 # stdlib import
 import array
+import collections
+import copy
 import enum
+import functools
+import hashlib
+import itertools
+import math
+import operator
+import os
+import pathlib
+import sys
 
 
 class IntCodeMachineState(enum.Enum):
     CLEAN = enum.auto()
     HALTED = enum.auto()
     WAITING_FOR_INPUT = enum.auto()
+    BUDGET_EXHAUSTED = enum.auto()
+
+
+# Number of parameters taken by each opcode
+parameterCounts = {1: 3, 2: 3, 3: 1, 4: 1, 5: 2, 6: 2, 7: 3, 8: 3, 9: 1, 99: 0}
+
+# Short names of the opcodes, for listings and reports
+opcodeNames = {
+    1: "add",
+    2: "mul",
+    3: "in",
+    4: "out",
+    5: "jnz",
+    6: "jz",
+    7: "lt",
+    8: "eq",
+    9: "arb",
+    99: "halt",
+}
+
+
+def buildDecodeTable():
+    """Map every legal instruction word to its opcode and param modes"""
+    table = dict()
+    for opcode in parameterCounts:
+        for modes in itertools.product(range(3), repeat=3):
+            instruction = (
+                opcode + 100 * modes[0] + 1000 * modes[1] + 10000 * modes[2]
+            )
+            table[instruction] = (opcode, *modes)
+    return table
+
+
+def buildInstructionTable(dispatchTable):
+    """Map every legal instruction word to its handler and param modes"""
+    return {
+        instruction: (dispatchTable[opcode], modeA, modeB, modeC)
+        for instruction, (opcode, modeA, modeB, modeC) in decodeTable.items()
+    }
+
+
+# Precomputed decoding of all legal instruction words
+decodeTable = buildDecodeTable()
+
+# Memory is split into pages of 2 ** pageShift values
+pageShift = 10
+pageSize = 1 << pageShift
+pageMask = pageSize - 1
+
+# Pages below this limit are kept in a list, pages above it in a dict
+densePageLimit = 1024
+
+# Shared, read-only page that every unallocated page reads from
+zeroPage = memoryview(array.array("q", bytes(8 * pageSize))).toreadonly()
+
+# Compiled programs and cached runs are stored under this directory
+cacheDirectory = pathlib.Path(
+    os.environ.get("INTCODE_CACHE_DIR", "~/.cache/intcode")
+).expanduser()
+
+# Everything needed to put a machine back the way it was
+MachineSnapshot = collections.namedtuple(
+    "MachineSnapshot",
+    [
+        "memory",
+        "state",
+        "position",
+        "relativeBase",
+        "inputValues",
+        "outputValues",
+    ],
+)
+
+
+def makePage(values):
+    # Pages are compact arrays of 64-bit values, unless they hold a value too
+    # big for one, in which case they're promoted to a list of ints
+    try:
+        return array.array("q", values)
+    except OverflowError:
+        return list(values)
+
+
+def sharedPage(page):
+    # Arrays are shared as read-only views of themselves and promoted pages
+    # as tuples, so that writing to either one fails
+    if isinstance(page, list):
+        return tuple(page)
+    if isinstance(page, array.array):
+        return memoryview(page).toreadonly()
+    return page
+
+
+def writablePage(page):
+    # Private copy of a shared page, in the same storage it was shared from
+    if isinstance(page, tuple):
+        return list(page)
+    return array.array("q", page.tobytes())
+
+
+class PagedMemory:
+    """Machine memory split into fixed size pages that are copied on write
+
+    The low end of the address space, which holds the program image, is a
+    list of pages indexed directly by page number. Above `densePageLimit`
+    pages are kept sparsely in a dict, so any address in the 64-bit space
+    can be read or written without allocating everything below it.
+
+    Pages shared with a fork or a snapshot are held as read-only views, so
+    the first write to one of them fails and makes a private copy. Pages
+    that have never been written share a single read-only page of zeroes.
+
+    Values are stored as signed 64-bit integers. A page that has to hold a
+    bigger value is promoted to a list of Python ints, so programs working
+    with big numbers stay correct and only the pages holding them pay for
+    it.
+
+    Negative addresses are an error.
+    """
+
+    def __init__(self, values=()):
+        # Pad the values out to a whole number of pages
+        values = list(values)
+        self.imageLength = len(values)
+        values.extend([0] * (-len(values) % pageSize))
+
+        # Split them up into a list of pages
+        self.pages = [
+            makePage(values[start : start + pageSize])
+            for start in range(0, len(values), pageSize)
+        ]
+
+        # Pages beyond the dense list, keyed by page number
+        self.sparsePages = dict()
+
+    def __len__(self):
+        # Size of the densely paged part of the address space
+        return len(self.pages) << pageShift
+
+    def __iter__(self):
+        for page in self.pages:
+            yield from page
+
+    def __getitem__(self, address):
+        # Slices are copied out into a list
+        if isinstance(address, slice):
+            return list(
+                map(self.__getitem__, range(*address.indices(len(self))))
+            )
+        if address < 0:
+            raise RuntimeError("Negative memory address")
+
+        # Anything past the dense pages is looked up in the sparse ones
+        try:
+            return self.pages[address >> pageShift][address & pageMask]
+        except IndexError:
+            return self.sparsePages.get(address >> pageShift, zeroPage)[
+                address & pageMask
+            ]
+
+    def __setitem__(self, address, value):
+        if address < 0:
+            raise RuntimeError("Negative memory address")
+        index = address >> pageShift
+        try:
+            self.pages[index][address & pageMask] = value
+
+        # Past the dense pages, either extend them with zero pages or fall
+        # back to a sparse page
+        except IndexError:
+            if index < densePageLimit:
+                self.pages.extend([zeroPage] * (index - len(self.pages) + 1))
+                self[address] = value
+            else:
+                self.setSparse(address, value)
+
+        # The page is read-only, so take a private copy of it first. Any other
+        # page failing this way was given a value that isn't an int.
+        except TypeError:
+            page = self.pages[index]
+            if not isinstance(page, (memoryview, tuple)):
+                raise
+            self.pages[index] = writablePage(page)
+            self[address] = value
+
+        # The value doesn't fit in 64 bits, so promote the page
+        except OverflowError:
+            self.pages[index] = list(self.pages[index])
+            self[address] = value
+
+    def setSparse(self, address, value):
+        # Allocate or copy the page if it isn't writable, then write to it
+        index = address >> pageShift
+        page = self.sparsePages.get(index, zeroPage)
+        if isinstance(page, (memoryview, tuple)):
+            page = self.sparsePages[index] = writablePage(page)
+        try:
+            page[address & pageMask] = value
+        except OverflowError:
+            page = self.sparsePages[index] = list(page)
+            page[address & pageMask] = value
+
+    def __getstate__(self):
+        # Read-only views can't be pickled, so turn pages into plain arrays
+        # or lists, and mark unallocated pages with None
+        def pickleable(page):
+            if page is zeroPage:
+                return None
+            if isinstance(page, (memoryview, tuple)):
+                return writablePage(page)
+            return page
+
+        return (
+            self.imageLength,
+            [pickleable(page) for page in self.pages],
+            {
+                index: pickleable(page)
+                for index, page in self.sparsePages.items()
+            },
+        )
+
+    def __setstate__(self, state):
+        self.imageLength, pages, sparsePages = state
+        self.pages = [zeroPage if page is None else page for page in pages]
+        self.sparsePages = sparsePages
+
+    def share(self):
+        """Make every page read-only, so the next write to it is a copy
+
+        Returns the shared pages, which can be handed back to `restore`.
+        """
+        for pages in (self.pages, self.sparsePages):
+            for index, page in (
+                pages.items() if isinstance(pages, dict) else enumerate(pages)
+            ):
+                pages[index] = sharedPage(page)
+        return (tuple(self.pages), dict(self.sparsePages))
+
+    def restore(self, shared):
+        """Go back to pages previously returned by `share`"""
+        pages, sparsePages = shared
+        self.pages[:] = pages
+        self.sparsePages.clear()
+        self.sparsePages.update(sparsePages)
+
+    def fork(self):
+        """Create a copy of the memory that shares every page with this one"""
+        child = PagedMemory()
+        child.imageLength = self.imageLength
+        child.restore(self.share())
+        return child
+
+    def allocatedPages(self):
+        """Every page that has actually been allocated"""
+        return [
+            page
+            for page in itertools.chain(self.pages, self.sparsePages.values())
+            if page is not zeroPage
+        ]
+
+    def sharedPageCount(self):
+        """Number of allocated pages still shared with a fork or snapshot"""
+        return sum(
+            isinstance(page, (memoryview, tuple))
+            for page in self.allocatedPages()
+        )
+
+
+# Opcodes that can be fused with the instructions after them, up to a
+# conditional jump, and the most instructions fused together
+fusableOpcodes = {1, 2, 7, 8, 9}
+jumpOpcodes = {5, 6}
+maxFusedInstructions = 3
+
+# Values written by the arithmetic and comparison opcodes
+operations = {
+    1: operator.add,
+    2: operator.mul,
+    7: lambda a, b: int(a < b),
+    8: lambda a, b: int(a == b),
+}
+
+
+def readOperand(machine, mode, param):
+    # Resolve a param that's already known the same way as readParam
+    if mode == 1:
+        return param
+    elif mode == 2:
+        param += machine.relativeBase
+    if param < 0:
+        raise RuntimeError("Negative memory address")
+    try:
+        return machine.memory.pages[param >> pageShift][param & pageMask]
+    except IndexError:
+        return machine.memory[param]
+
+
+def decodeFusedSequence(address, values):
+    """Decode a sequence of instructions to fuse into its steps and jump
+
+    Every step is an operation, three (mode, param) pairs, the position after
+    it and the lowest relative base its params can be resolved with without
+    addressing below zero, with no operation for a relative base adjustment.
+    The jump is
+    whether it jumps if true, its (mode, param) pairs and the position after
+    it. Also returns whether the jump tests the value the last step wrote.
+    """
+    steps = []
+    position = address
+    while True:
+        opcode, *modes = decodeTable[values[position - address]]
+        count = parameterCounts[opcode]
+        params = list(values[position - address + 1 :][:count])
+        position += 1 + count
+        if opcode in jumpOpcodes:
+            break
+        params += [0] * (3 - count)
+        lowestBase = max(
+            (
+                -param if mode == 2 else math.inf if param < 0 else -math.inf
+                for mode, param in zip(modes, params)
+                if mode != 1
+            ),
+            default=-math.inf,
+        )
+        steps.append(
+            (
+                operations.get(opcode),
+                *itertools.chain(*zip(modes, params)),
+                position,
+                lowestBase,
+            )
+        )
+    jump = (opcode == 5, *itertools.chain(*zip(modes, params)), position)
+
+    # A jump testing the value just written can use it without reading it
+    # back, as long as nothing moved the relative base in between
+    lastStep = steps[-1]
+    testsResult = (
+        modes[0] != 1
+        and lastStep[0] is not None
+        and lastStep[5:7] == (modes[0], params[0])
+    )
+    return steps, jump, testsResult
+
+
+def fuseInstructions(address, values):
+    """Build a single handler for the sequence of instructions in `values`
+
+    The sequence is one or more arithmetic, comparison or relative base
+    instructions followed by a conditional jump, starting at `address`. Its
+    params are baked into the handler, so it may only be run while memory
+    still holds `values` there. The handler returns the number of
+    instructions it ran.
+    """
+    steps, jump, testsResult = decodeFusedSequence(address, values)
+    jumpIfTrue, conditionMode, conditionParam, targetMode, targetParam, end = (
+        jump
+    )
+
+    def fused(machine):
+        memory = machine.memory
+        pages = memory.pages
+        relativeBase = machine.relativeBase
+        count = 0
+        for (
+            operation,
+            modeA,
+            paramA,
+            modeB,
+            paramB,
+            modeC,
+            paramC,
+            nextPosition,
+            lowestBase,
+        ) in steps:
+            count += 1
+            if relativeBase < lowestBase:
+                raise RuntimeError("Negative memory address")
+
+            # Read the first param straight from the pages, like readParam
+            if modeA != 1:
+                if modeA == 2:
+                    paramA += relativeBase
+                try:
+                    paramA = pages[paramA >> pageShift][paramA & pageMask]
+                except IndexError:
+                    paramA = memory[paramA]
+
+            # Relative base adjustments just move the base
+            if operation is None:
+                relativeBase += paramA
+                continue
+
+            # Anything else reads a second param and writes its result
+            if modeB != 1:
+                if modeB == 2:
+                    paramB += relativeBase
+                try:
+                    paramB = pages[paramB >> pageShift][paramB & pageMask]
+                except IndexError:
+                    paramB = memory[paramB]
+            value = operation(paramA, paramB)
+            if modeC == 2:
+                paramC += relativeBase
+            try:
+                pages[paramC >> pageShift][paramC & pageMask] = value
+            except (IndexError, TypeError, OverflowError):
+                memory[paramC] = value
+
+            # A write into the sequence itself ends it early, leaving the
+            # rest to the interpreter
+            if address <= paramC < end:
+                machine.relativeBase = relativeBase
+                machine.position = nextPosition
+                return count
+        machine.relativeBase = relativeBase
+
+        # Finally take the jump, or step past it
+        condition = (
+            value
+            if testsResult
+            else readOperand(machine, conditionMode, conditionParam)
+        )
+        if (condition != 0) == jumpIfTrue:
+            machine.position = readOperand(machine, targetMode, targetParam)
+        else:
+            machine.position = end
+        return count + 1
+
+    return fused
+
+
+def findFusions(values):
+    """Find every sequence of instructions in a program that can be fused
+
+    Returns the fused handlers keyed by the address of the sequence, along
+    with the values the sequence is made of. Sequences crossing a page
+    boundary are left alone.
+    """
+    fusions = dict()
+    for address in range(len(values)):
+        # Gather fusable instructions until a conditional jump
+        position = address
+        opcodes = []
+        while len(opcodes) < maxFusedInstructions and position < len(values):
+            decoded = decodeTable.get(values[position])
+            if decoded is None:
+                break
+            opcodes.append(decoded[0])
+            position += 1 + parameterCounts[decoded[0]]
+            if decoded[0] not in fusableOpcodes:
+                break
+
+        # Only keep whole sequences that end in a jump within a page
+        if (
+            len(opcodes) < 2
+            or opcodes[-1] not in jumpOpcodes
+            or position > len(values)
+            or address >> pageShift != (position - 1) >> pageShift
+        ):
+            continue
+
+        sequence = values[address:position]
+        fusions[address] = (
+            fuseInstructions(address, sequence),
+            makePage(sequence),
+        )
+    return fusions
+
+
+class ProgramImage:
+    """A program parsed once into read-only pages
+
+    Machines created from the image share its pages, copying each one only
+    when they first write to it, so creating or resetting a machine costs
+    a page table copy rather than a parse.
+    """
+
+    def __init__(self, instructions):
+        # Convert the comma-delimited string of numbers into shared pages
+        self.memory = PagedMemory(
+            map(lambda op: int(op), instructions.strip().split(","))
+        )
+        self.pages = self.memory.share()
+
+    @classmethod
+    def fromPages(cls, pages, length):
+        """Create an image of `length` values held in existing pages
+
+        The pages are used as they are rather than copied, so read-only
+        views of memory that's mapped elsewhere can back an image.
+        """
+        image = cls.__new__(cls)
+        image.memory = PagedMemory()
+        image.memory.imageLength = length
+        image.memory.pages = list(pages)
+        image.pages = image.memory.share()
+        return image
+
+    def __len__(self):
+        return self.memory.imageLength
+
+    @functools.cached_property
+    def hash(self):
+        """SHA-256 of the program, hashed the same way as the compiler does"""
+        values = self.memory[: len(self)]
+        return hashlib.sha256(",".join(map(str, values)).encode()).hexdigest()
+
+    @functools.cached_property
+    def fusions(self):
+        """Fused handlers for the instruction sequences in the image"""
+        return findFusions(self.memory[: len(self)])
+
+    def load(self):
+        """Create a fresh memory holding the image"""
+        memory = PagedMemory()
+        memory.imageLength = self.memory.imageLength
+        memory.restore(self.pages)
+        return memory
+
+
+def loadImage(instructions):
+    """Get the parsed image of a program, parsing it if needed
+
+    Only the most recently loaded programs are kept parsed, keyed by their
+    text without any surrounding whitespace.
+    """
+    if isinstance(instructions, ProgramImage):
+        return instructions
+    return parseImage(instructions.strip())
+
+
+@functools.lru_cache(maxsize=32)
+def parseImage(text):
+    # Images of the programs most recently parsed by this process
+    return ProgramImage(text)
+
+
+class OutputFrames:
+    """Output consumer that groups values into tuples of `arity` values
+
+    Each complete tuple is passed on to `consumer`, so only a partial frame
+    is ever held.
+    """
+
+    def __init__(self, consumer, arity):
+        self.consumer = consumer
+        self.arity = arity
+        self.values = []
+
+    def __call__(self, value):
+        values = self.values
+        values.append(value)
+        if len(values) == self.arity:
+            self.consumer(tuple(values))
+            values.clear()
 
 
 class IntCodeMachine:
     def __init__(self, instructions):
-        # Machine starts in a clean state
-        self.state = IntCodeMachineState.CLEAN
+        # Programs are given as comma-delimited text or as a ProgramImage,
+        # and text is only parsed the first time it's seen
+        self.image = loadImage(instructions)
+        self.memory = self.image.load()
 
-        # Convert the comma-delimited string of numbers into a memory-
-        # efficient array of signed long long's
-        self.memory = array.array(
-            "q", map(lambda op: int(op), instructions.strip().split(","))
-        )
+        # Queues of input values waiting to be read and captured outputs
+        self.inputValues = collections.deque()
+        self.outputValues = collections.deque()
 
-        # Input value is None
-        self.inputValue = None
+        # Callables given each output as it's produced, instead of it being
+        # captured
+        self.outputConsumers = []
 
-        # Empty list to capture output values
-        self.outputValues = []
+        self.reset()
+
+    def reset(self):
+        """Put the machine back to the start of its program"""
+        # Machine starts in a clean state
+        self.state = IntCodeMachineState.CLEAN
+
+        # Memory goes back to the pristine image
+        self.memory.restore(self.image.pages)
+        self.inputValues.clear()
+        self.outputValues.clear()
 
         # Starting register values
         self.position = 0
         self.relativeBase = 0
 
-    # Recursive function to split a decimal into digits
-    def getDigits(self, n):
-        if n < 10:
-            return [n]
+        # Number of instructions run by execute
+        self.instructionCount = 0
+
+    @property
+    def inputValue(self):
+        # The next input value waiting to be read, if any
+        return self.inputValues[0] if self.inputValues else None
+
+    @inputValue.setter
+    def inputValue(self, value):
+        # Setting a single input value queues it up
+        if value is not None:
+            self.inputValues.append(value)
+
+    def feed(self, values):
+        """Queue up any number of input values"""
+        self.inputValues.extend(values)
+
+    def drain(self):
+        """Remove and return all the output values captured so far"""
+        values = list(self.outputValues)
+        self.outputValues.clear()
+        return values
+
+    def connectOutput(self, consumer, arity=1):
+        """Give every output to `consumer` as it's produced
+
+        With an `arity` above 1, outputs are grouped into tuples of that
+        many values first. Once anything is connected, outputs are no longer
+        captured in `outputValues`.
+        """
+        if arity > 1:
+            consumer = OutputFrames(consumer, arity)
+        self.outputConsumers.append(consumer)
+
+    def emit(self, value):
+        # Hand the value to every consumer, or capture it if there are none
+        if self.outputConsumers:
+            for consumer in self.outputConsumers:
+                consumer(value)
         else:
-            r = self.getDigits(n // 10)
-            return r + [n % 10]
+            self.outputValues.append(value)
 
-    def splitInstruction(self, n):
-        # Split the instruction into digits and reverse them
-        digits = list(reversed(self.getDigits(n)))
+    def fork(self):
+        """Create a copy of the machine that shares memory until written
 
-        # Zero fill the digits array
-        for i in range(5 - len(digits)):
-            digits.append(0)
+        The copy captures its outputs until something is connected to it.
+        """
+        child = copy.copy(self)
+        child.memory = self.memory.fork()
+        child.inputValues = collections.deque(self.inputValues)
+        child.outputValues = collections.deque(self.outputValues)
+        child.outputConsumers = []
+        return child
 
-        # Consolidate the ones and tens place into an opcode
-        opcode = digits[0] + 10 * digits[1]
+    def snapshot(self):
+        """Capture the machine's state so it can be restored later"""
+        return MachineSnapshot(
+            self.memory.share(),
+            self.state,
+            self.position,
+            self.relativeBase,
+            tuple(self.inputValues),
+            tuple(self.outputValues),
+        )
 
-        # Return the opcode and param modes
-        return (opcode, digits[2], digits[3], digits[4])
+    def restore(self, snapshot):
+        """Put the machine back to the state captured by a snapshot"""
+        self.memory.restore(snapshot.memory)
+        self.state = snapshot.state
+        self.position = snapshot.position
+        self.relativeBase = snapshot.relativeBase
+        self.inputValues = collections.deque(snapshot.inputValues)
+        self.outputValues = collections.deque(snapshot.outputValues)
+
+    def splitInstruction(self, n):
+        # Legal instruction words are decoded by a simple table lookup
+        decoded = decodeTable.get(n)
+        if decoded is not None:
+            return decoded
+
+        # Anything else is split arithmetically so it can still be reported
+        return (n % 100, n // 100 % 10, n // 1000 % 10, n // 10000 % 10)
 
     def resolveValue(self, param, paramMode):
         # If in immediate mode, return the value directly
@@ -61,150 +700,467 @@ class IntCodeMachine:
         elif paramMode == 2:
             param += self.relativeBase
 
-        # If the address is larger than the memory space, return 0
-        if param >= len(self.memory):
-            return 0
+        # Read the value from memory
         return self.memory[param]
 
+    def readParam(self, offset, paramMode):
+        # Read the current instruction's param at `offset`, and resolve it
+        # the same way as resolveValue, going straight to the pages
+        pages = self.memory.pages
+        address = self.position + offset
+        try:
+            param = pages[address >> pageShift][address & pageMask]
+            if paramMode == 1:
+                return param
+            elif paramMode == 2:
+                param += self.relativeBase
+            if param < 0:
+                raise RuntimeError("Negative memory address")
+            return pages[param >> pageShift][param & pageMask]
+
+        # Leave anything past the last page to the memory itself
+        except IndexError:
+            return self.resolveValue(self.memory[address], paramMode)
+
+    def writeParam(self, offset, paramMode, value):
+        # Read the address from the current instruction's param at `offset`
+        pages = self.memory.pages
+        address = self.position + offset
+        try:
+            address = pages[address >> pageShift][address & pageMask]
+        except IndexError:
+            address = self.memory[address]
+        if paramMode == 2:
+            address += self.relativeBase
+        if address < 0:
+            raise RuntimeError("Negative memory address")
+
+        # Write the value the same way as assignValue, and return the address
+        try:
+            pages[address >> pageShift][address & pageMask] = value
+        except (IndexError, TypeError, OverflowError):
+            self.memory[address] = value
+        return address
+
     def assignValue(self, address, mode, value):
         # If relative mode is specified, make the address relative to the base
         if mode == 2:
             address += self.relativeBase
 
-        # If trying to assign to an address outside of memory space,
-        # allocate more memory space
-        if address >= len(self.memory):
-            for i in range(address - len(self.memory) + 1):
-                self.memory.append(0)
-
-        # Assign the value
+        # Write the value to memory, which allocates and copies pages as
+        # needed
         self.memory[address] = value
 
-    def execute(self):
+    # Code 1 is addition
+    def opAdd(self, modeA, modeB, modeC):
+        self.writeParam(
+            3,
+            modeC,
+            self.readParam(1, modeA) + self.readParam(2, modeB),
+        )
+        self.position += 4
+
+    # Code 2 is multiplication
+    def opMultiply(self, modeA, modeB, modeC):
+        self.writeParam(
+            3,
+            modeC,
+            self.readParam(1, modeA) * self.readParam(2, modeB),
+        )
+        self.position += 4
+
+    # Code 3 is input
+    def opInput(self, modeA, modeB, modeC):
+        # If input is not available, stop execution
+        if not self.inputValues:
+            self.state = IntCodeMachineState.WAITING_FOR_INPUT
+            return True
+
+        # Store the next value at the indicated pointer position
+        self.writeParam(1, modeA, self.inputValues.popleft())
+
+        # Advance the code position
+        self.position += 2
+
+    # Code 4 is output
+    def opOutput(self, modeA, modeB, modeC):
+        self.emit(self.readParam(1, modeA))
+        self.position += 2
+
+    # Code 5 jumps if the first parameter is non-zero
+    def opJumpIfTrue(self, modeA, modeB, modeC):
+        if self.readParam(1, modeA) != 0:
+            self.position = self.readParam(2, modeB)
+        else:
+            self.position += 3
+
+    # Code 6 jumps if the first parameter is zero
+    def opJumpIfFalse(self, modeA, modeB, modeC):
+        if self.readParam(1, modeA) == 0:
+            self.position = self.readParam(2, modeB)
+        else:
+            self.position += 3
+
+    # Code 7 is less-than comparison
+    def opLessThan(self, modeA, modeB, modeC):
+        self.writeParam(
+            3,
+            modeC,
+            int(self.readParam(1, modeA) < self.readParam(2, modeB)),
+        )
+        self.position += 4
+
+    # Code 8 is equality comparison
+    def opEquals(self, modeA, modeB, modeC):
+        self.writeParam(
+            3,
+            modeC,
+            int(self.readParam(1, modeA) == self.readParam(2, modeB)),
+        )
+        self.position += 4
+
+    # Code 9 adjust the relative base
+    def opAdjustRelativeBase(self, modeA, modeB, modeC):
+        self.relativeBase += self.readParam(1, modeA)
+        self.position += 2
+
+    # Code 99 means immediate termination
+    def opHalt(self, modeA, modeB, modeC):
+        self.state = IntCodeMachineState.HALTED
+        return True
+
+    # Handler for each opcode. A handler returns True to interrupt execution.
+    dispatchTable = {
+        1: opAdd,
+        2: opMultiply,
+        3: opInput,
+        4: opOutput,
+        5: opJumpIfTrue,
+        6: opJumpIfFalse,
+        7: opLessThan,
+        8: opEquals,
+        9: opAdjustRelativeBase,
+        99: opHalt,
+    }
+
+    # Every legal instruction word mapped straight to its handler and modes
+    instructionTable = buildInstructionTable(dispatchTable)
+
+    # Fused handlers write straight to the pages without going through
+    # writeParam, so engines that hook writes turn them off
+    useFusions = True
+
+    def execute(self, maxSteps=None):
+        """Run until the machine halts or runs out of input
+
+        If `maxSteps` is given, also stop after that many instructions in the
+        `BUDGET_EXHAUSTED` state. Calling execute again carries on from there.
+
+        Without a budget, and unless `useFusions` is turned off, common
+        sequences of instructions found when the program was loaded are run
+        as single fused handlers, for as long as memory still holds them.
+        """
         # Make surethe machine isn't already halted
         if self.state is IntCodeMachineState.HALTED:
             raise RuntimeError("Machine is already halted")
 
-        # Loop infinitely until we reach the termination instruction
-        while True:
-            # Get the code at the current read position
-            instruction = self.memory[self.position]
+        # Loop until a handler interrupts execution or the budget runs out.
+        # The loop counter doubles as the count of instructions executed, so
+        # the budget costs nothing extra per instruction. Fused sequences
+        # run several instructions at once, so they're only used without a
+        # budget, and the extra instructions are counted separately.
+        instructionTable = self.instructionTable
+        pages = self.memory.pages
+        fusions = (
+            self.image.fusions if maxSteps is None and self.useFusions else {}
+        )
+        budget = sys.maxsize if maxSteps is None else maxSteps
+        executed = 0
+        fusedExtra = 0
+        try:
+            for executed in range(budget):
+                # Run a fused sequence at this address if memory still holds
+                # exactly the instructions it was built from
+                position = self.position
+                fused = fusions.get(position)
+                if fused is not None:
+                    handler, values = fused
+                    offset = position & pageMask
+                    page = pages[position >> pageShift]
+                    if page[offset : offset + len(values)] == values:
+                        fusedExtra += handler(self) - 1
+                        continue
 
-            # Split the opcode and params apart
-            opcode, paramModeA, paramModeB, paramModeC = self.splitInstruction(
-                instruction
-            )
+                # Look up the handler and param modes for the current
+                # instruction
+                try:
+                    instruction = pages[position >> pageShift][
+                        position & pageMask
+                    ]
+                except IndexError:
+                    instruction = self.memory[position]
+                decoded = instructionTable.get(instruction)
 
-            # Code 99 means immediate termination
-            if opcode == 99:
-                self.state = IntCodeMachineState.HALTED
-                break
+                # Unknown opcode means there was an error
+                if decoded is None:
+                    raise RuntimeError(
+                        f"Unknown opcode {self.splitInstruction(instruction)[0]} ({instruction}) at position {self.position}"
+                    )
 
-            # Code 1 and 2 are arithmatic
-            elif opcode in [1, 2]:
-                # Get memory values
-                paramA = self.resolveValue(
-                    self.memory[self.position + 1], paramModeA
-                )
-                paramB = self.resolveValue(
-                    self.memory[self.position + 2], paramModeB
-                )
-
-                # Perform the addition
-                self.assignValue(
-                    self.memory[self.position + 3],
-                    paramModeC,
-                    paramA + paramB if opcode == 1 else paramA * paramB,
-                )
-
-                # Advance the code position by 4
-                self.position += 4
-
-            # Code 3 is input
-            elif opcode == 3:
-                # If input is not available, stop execution
-                if self.inputValue is None:
-                    self.state = IntCodeMachineState.WAITING_FOR_INPUT
+                # Execute the instruction. Halting counts as an instruction,
+                # waiting for input doesn't.
+                handler, paramModeA, paramModeB, paramModeC = decoded
+                if handler(self, paramModeA, paramModeB, paramModeC):
+                    if self.state is IntCodeMachineState.HALTED:
+                        executed += 1
                     break
+            else:
+                executed = budget
+                self.state = IntCodeMachineState.BUDGET_EXHAUSTED
+        finally:
+            self.instructionCount += executed + fusedExtra
+
+    # One flat loop so the registers stay in locals on the hot path
+    def run(self):  # noqa: C901
+        """Run the machine as a generator, yielding each output value
+
+        When the machine runs out of input it yields `WAITING_FOR_INPUT`
+        instead. A value passed in with `send()` at any yield is queued as
+        input. Outputs are also given to any connected consumers. The registers are kept in locals while the generator runs and
+        are only saved back to the machine once it finishes or is closed.
+        """
+        # Make surethe machine isn't already halted
+        if self.state is IntCodeMachineState.HALTED:
+            raise RuntimeError("Machine is already halted")
+
+        # Pull everything the loop needs into locals. Memory is read straight
+        # from its pages, leaving anything past the last page to the memory.
+        memory = self.memory
+        pages = memory.pages
+        inputValues = self.inputValues
+        decode = decodeTable
+        position = self.position
+        relativeBase = self.relativeBase
+
+        try:
+            while True:
+                # Decode the current instruction
+                try:
+                    instruction = pages[position >> pageShift][
+                        position & pageMask
+                    ]
+                except IndexError:
+                    instruction = memory[position]
+                decoded = decode.get(instruction)
+                if decoded is None:
+                    raise RuntimeError(
+                        f"Unknown opcode {self.splitInstruction(instruction)[0]} ({instruction}) at position {position}"
+                    )
+                opcode, modeA, modeB, modeC = decoded
+
+                # Code 99 means immediate termination
+                if opcode == 99:
+                    self.state = IntCodeMachineState.HALTED
+                    return
+
+                # Every other instruction has a first param. Resolve its
+                # address, where immediate params address themselves.
+                addressA = position + 1
+                if modeA != 1:
+                    try:
+                        addressA = pages[addressA >> pageShift][
+                            addressA & pageMask
+                        ]
+                    except IndexError:
+                        addressA = memory[addressA]
+                    if modeA == 2:
+                        addressA += relativeBase
+                    if addressA < 0:
+                        raise RuntimeError("Negative memory address")
+
+                # Code 3 is input
+                if opcode == 3:
+                    # If input is not available, wait for some to be sent
+                    if not inputValues:
+                        self.state = IntCodeMachineState.WAITING_FOR_INPUT
+                        sent = yield IntCodeMachineState.WAITING_FOR_INPUT
+                        if sent is not None:
+                            inputValues.append(sent)
+                        continue
+
+                    # Store the next value
+                    memory[addressA] = inputValues.popleft()
+                    position += 2
+                    continue
+
+                # All remaining instructions read their first param
+                try:
+                    valueA = pages[addressA >> pageShift][addressA & pageMask]
+                except IndexError:
+                    valueA = memory[addressA]
+
+                # Code 4 is output, which also goes to any consumers
+                if opcode == 4:
+                    position += 2
+                    if self.outputConsumers:
+                        self.emit(valueA)
+                    sent = yield valueA
+                    if sent is not None:
+                        inputValues.append(sent)
+                    continue
 
-                # Store the value at the indicated pointer position
-                self.assignValue(
-                    self.memory[self.position + 1], paramModeA, self.inputValue
-                )
-
-                # Zero out the input value
-                self.inputValue = None
-
-                # Advance the code position
-                self.position += 2
-
-            # Code 4 is output
-            elif opcode == 4:
-                # Determine the value and print it
-                value = self.resolveValue(
-                    self.memory[self.position + 1], paramModeA
-                )
-                self.outputValues.append(value)
-
-                # Advance the code position
-                self.position += 2
-
-            # Code 5 and 6 are conditional jumps
-            elif opcode in [5, 6]:
-                # Get memory values
-                paramA = self.resolveValue(
-                    self.memory[self.position + 1], paramModeA
-                )
-                paramB = self.resolveValue(
-                    self.memory[self.position + 2], paramModeB
-                )
-
-                # If non-zero, set the position pointer
-                if (opcode == 5 and paramA != 0) or (
-                    opcode == 6 and paramA == 0
-                ):
-                    self.position = paramB
-
-                # Else, do nothing and advance the position naturally
+                # Code 9 adjusts the relative base
+                if opcode == 9:
+                    relativeBase += valueA
+                    position += 2
+                    continue
+
+                # Everything else reads a second param as well
+                addressB = position + 2
+                if modeB != 1:
+                    try:
+                        addressB = pages[addressB >> pageShift][
+                            addressB & pageMask
+                        ]
+                    except IndexError:
+                        addressB = memory[addressB]
+                    if modeB == 2:
+                        addressB += relativeBase
+                    if addressB < 0:
+                        raise RuntimeError("Negative memory address")
+                try:
+                    valueB = pages[addressB >> pageShift][addressB & pageMask]
+                except IndexError:
+                    valueB = memory[addressB]
+
+                # Code 5 and 6 are conditional jumps
+                if opcode == 5:
+                    position = valueB if valueA != 0 else position + 3
+                    continue
+                elif opcode == 6:
+                    position = valueB if valueA == 0 else position + 3
+                    continue
+
+                # Code 1, 2, 7 and 8 compute a value to write
+                if opcode == 1:
+                    value = valueA + valueB
+                elif opcode == 2:
+                    value = valueA * valueB
+                elif opcode == 7:
+                    value = int(valueA < valueB)
                 else:
-                    self.position += 3
-
-            # Code 7 and 8 are comparison
-            elif opcode in [7, 8]:
-                # Get memory values
-                paramA = self.resolveValue(
-                    self.memory[self.position + 1], paramModeA
-                )
-                paramB = self.resolveValue(
-                    self.memory[self.position + 2], paramModeB
-                )
-
-                # Determine the value based on the opcode
-                if opcode == 7:
-                    flag = paramA < paramB
-                elif opcode == 8:
-                    flag = paramA == paramB
-
-                # Write the value to memory
-                self.assignValue(
-                    self.memory[self.position + 3], paramModeC, int(flag)
-                )
-
-                # Advance the code position by 4
-                self.position += 4
-
-            # Code 9 adjust the relative base
-            elif opcode == 9:
-                # Determine the value and modify the base
-                self.relativeBase += self.resolveValue(
-                    self.memory[self.position + 1], paramModeA
-                )
-
-                # Advance the code position
-                self.position += 2
-
-            # Unknown opcode means there was an error
-            else:
-                raise RuntimeError(
-                    f"Unknown opcode {opcode} ({instruction}) at position {self.position}"
-                )
+                    value = int(valueA == valueB)
+
+                # Resolve the address of the third param and write to it
+                addressC = position + 3
+                try:
+                    addressC = pages[addressC >> pageShift][
+                        addressC & pageMask
+                    ]
+                except IndexError:
+                    addressC = memory[addressC]
+                if modeC == 2:
+                    addressC += relativeBase
+                if addressC < 0:
+                    raise RuntimeError("Negative memory address")
+                try:
+                    pages[addressC >> pageShift][addressC & pageMask] = value
+                except (IndexError, TypeError, OverflowError):
+                    memory[addressC] = value
+                position += 4
+
+        # Save the registers back to the machine when the generator finishes
+        finally:
+            self.position = position
+            self.relativeBase = relativeBase
+
+
+class AsciiAdapter:
+    """Text interface to a machine that reads and writes ASCII
+
+    Lines are queued as input a whole line at a time, and output is only
+    decoded when it's read, in bulk. Output values outside the ASCII range,
+    like the big numbers some programs answer with, aren't text, so they're
+    kept in `values` in the order they were output instead.
+    """
+
+    def __init__(self, machine):
+        self.machine = machine
+
+        # Text decoded but not read yet, and the values that weren't text
+        self.text = ""
+        self.values = []
+
+    def writeLine(self, line):
+        """Queue a line of text as input, newline included"""
+        self.machine.feed(f"{line}\n".encode("ascii"))
+
+    def writeLines(self, lines):
+        """Queue any number of lines of text as input"""
+        text = "".join(f"{line}\n" for line in lines)
+        self.machine.feed(text.encode("ascii"))
+
+    def decode(self, values):
+        # Output is nearly always all text, which decodes in one go
+        if not values:
+            return
+        if 0 <= min(values) and max(values) <= 127:
+            self.text += bytes(values).decode("ascii")
+            return
+
+        # Otherwise decode the text between the values that aren't text
+        start = 0
+        for index, value in enumerate(values):
+            if not 0 <= value <= 127:
+                self.text += bytes(values[start:index]).decode("ascii")
+                self.values.append(value)
+                start = index + 1
+        self.text += bytes(values[start:]).decode("ascii")
+
+    def pump(self):
+        """Run the machine, if it can run, and decode what it outputs
+
+        Returns False once there's no more output without more input.
+        """
+        machine = self.machine
+        if machine.state is not IntCodeMachineState.HALTED and (
+            machine.inputValues
+            or machine.state is not IntCodeMachineState.WAITING_FOR_INPUT
+        ):
+            machine.execute()
+        values = machine.drain()
+        self.decode(values)
+        return bool(values)
+
+    def readUntil(self, prompt):
+        """Read the text up to and including `prompt`
+
+        If the machine stops before writing the prompt, everything it wrote
+        is returned instead.
+        """
+        searched = 0
+        while True:
+            index = self.text.find(prompt, searched)
+            if index >= 0:
+                end = index + len(prompt)
+                text, self.text = self.text[:end], self.text[end:]
+                return text
+
+            # Only search the new text next time round
+            searched = max(len(self.text) - len(prompt) + 1, 0)
+            if not self.pump():
+                text, self.text = self.text, ""
+                return text
+
+    def readLines(self):
+        """Yield each line of output, without its newline, until the machine
+        stops, then any unfinished line left at the end
+        """
+        while True:
+            *lines, self.text = self.text.split("\n")
+            yield from lines
+            if not self.pump():
+                break
+        if self.text:
+            text, self.text = self.text, ""
+            yield text
@@ -0,0 +1,190 @@
+# stdlib imports
+import types
+
+# local imports
+from common.compiler import decodeBlock, generateBlock
+from common.intcode import IntCodeMachine, IntCodeMachineState
+
+# Number of entries before a block is compiled
+hotThreshold = 10
+
+# Number of times a block can be thrown away before it's only interpreted
+maxInvalidations = 4
+
+# Code objects of compiled blocks, shared by every machine in the process,
+# and the most of them kept before the oldest are evicted
+compiledBlocks = dict()
+maxCompiledBlocks = 1024
+
+
+def compileBlock(memory, start):
+    """Compile the block at `start` into a code object, or None"""
+    instructions, end = decodeBlock(memory, start)
+    if not instructions:
+        return None, end
+
+    # Blocks are shared by anything with the same code at the same address
+    key = (start, tuple(memory[start:end]))
+    if key not in compiledBlocks:
+        if len(compiledBlocks) >= maxCompiledBlocks:
+            del compiledBlocks[next(iter(compiledBlocks))]
+        blockSource, end = generateBlock(memory, start)
+        namespace = dict()
+        exec(compile(blockSource, f"<jit block {start}>", "exec"), namespace)
+        compiledBlocks[key] = namespace[f"block_{start}"].__code__
+    return compiledBlocks[key], end
+
+
+class JitIntCodeMachine(IntCodeMachine):
+    """IntCode machine that compiles hot basic blocks while it runs
+
+    Blocks are counted each time execution enters them and compiled once
+    they reach `hotThreshold` entries. Writing to an address inside a
+    compiled block throws that block away again, and a block thrown away
+    `maxInvalidations` times is only interpreted from then on. Runs with an
+    instruction budget are interpreted, and only those count towards
+    `instructionCount`.
+    """
+
+    # Writes into the code have to be seen, so the interpreter this falls
+    # back to can't run fused handlers
+    useFusions = False
+
+    def resetJit(self):
+        # Compiled blocks by start address, and the blocks covering each
+        # address of code
+        self.blocks = dict()
+        self.codeRegion = dict()
+
+        # Namespace the compiled blocks run in
+        self.namespace = {"blocks": self.blocks, "codeRegion": self.codeRegion}
+
+        # Block entry and invalidation counts, blocks that keep being
+        # rewritten, and JIT counters
+        self.entryCounts = dict()
+        self.invalidationCounts = dict()
+        self.uncompilable = set()
+        self.jitHits = 0
+        self.jitMisses = 0
+        self.jitCompilations = 0
+        self.jitInvalidations = 0
+
+    # Handlers after which a new block starts
+    blockEnders = {
+        IntCodeMachine.opInput,
+        IntCodeMachine.opJumpIfTrue,
+        IntCodeMachine.opJumpIfFalse,
+    }
+
+    def assignValue(self, address, mode, value):
+        super().assignValue(address, mode, value)
+
+        # Throw away any compiled block that was written to
+        if mode == 2:
+            address += self.relativeBase
+        if address in self.codeRegion:
+            self.codeWritten(address)
+
+    def writeParam(self, offset, paramMode, value):
+        address = super().writeParam(offset, paramMode, value)
+
+        # Throw away any compiled block that was written to
+        if address in self.codeRegion:
+            self.codeWritten(address)
+        return address
+
+    def fork(self):
+        # Compiled blocks are tied to the parent, so the child starts afresh
+        child = super().fork()
+        child.resetJit()
+        return child
+
+    def restore(self, snapshot):
+        # Restored memory may hold different code, so start afresh
+        super().restore(snapshot)
+        self.resetJit()
+
+    def reset(self):
+        # Code patched before the reset is gone, so start afresh
+        super().reset()
+        self.resetJit()
+
+    def codeWritten(self, address):
+        # Forget every block covering the address
+        for start, end in list(self.codeRegion[address]):
+            del self.blocks[start]
+            self.entryCounts[start] = 0
+            invalidations = self.invalidationCounts.get(start, 0) + 1
+            self.invalidationCounts[start] = invalidations
+            if invalidations >= maxInvalidations:
+                self.uncompilable.add(start)
+            for covered in range(start, end):
+                self.codeRegion[covered].discard((start, end))
+                if not self.codeRegion[covered]:
+                    del self.codeRegion[covered]
+            self.jitInvalidations += 1
+
+    def compileHotBlock(self, start):
+        code, end = compileBlock(self.memory, start)
+        if code is None:
+            return None
+
+        # Bind the code to this machine's namespace and mark its addresses
+        block = types.FunctionType(code, self.namespace)
+        self.blocks[start] = block
+        for covered in range(start, end):
+            self.codeRegion.setdefault(covered, set()).add((start, end))
+        self.jitCompilations += 1
+        return block
+
+    def execute(self, maxSteps=None):
+        # Compiled blocks can't be stopped part way, so a budgeted run is
+        # left to the interpreter
+        if maxSteps is not None:
+            return super().execute(maxSteps)
+
+        # Make surethe machine isn't already halted
+        if self.state is IntCodeMachineState.HALTED:
+            raise RuntimeError("Machine is already halted")
+
+        blocks = self.blocks
+        entryCounts = self.entryCounts
+        memory = self.memory
+        instructionTable = self.instructionTable
+        blockEnders = self.blockEnders
+        uncompilable = self.uncompilable
+
+        while True:
+            # Run the compiled block at this address if there is one
+            block = blocks.get(self.position)
+            if block is not None:
+                self.jitHits += 1
+                self.position, self.relativeBase = block(
+                    self, memory, self.relativeBase
+                )
+                continue
+
+            # Count the entry and compile the block once it's hot
+            count = entryCounts.get(self.position, 0) + 1
+            entryCounts[self.position] = count
+            if (
+                count >= hotThreshold
+                and self.position not in uncompilable
+                and self.compileHotBlock(self.position)
+            ):
+                continue
+            self.jitMisses += 1
+
+            # Else interpret up to and including the end of the block
+            while True:
+                instruction = memory[self.position]
+                decoded = instructionTable.get(instruction)
+                if decoded is None:
+                    raise RuntimeError(
+                        f"Unknown opcode {self.splitInstruction(instruction)[0]} ({instruction}) at position {self.position}"
+                    )
+                handler, paramModeA, paramModeB, paramModeC = decoded
+                if handler(self, paramModeA, paramModeB, paramModeC):
+                    return
+                if handler in blockEnders:
+                    break
@@ -0,0 +1,280 @@
+# stdlib imports
+import bisect
+import collections
+import gzip
+import pickle
+import time
+
+# vendor imports
+import click
+
+# local imports
+from common.intcode import (
+    IntCodeMachine,
+    IntCodeMachineState,
+    MachineSnapshot,
+    buildInstructionTable,
+)
+
+# Full state of a machine as it was about to read an input, along with how
+# much of the journal had been recorded by then
+Checkpoint = collections.namedtuple(
+    "Checkpoint",
+    [
+        "inputCount",
+        "outputCount",
+        "state",
+        "position",
+        "relativeBase",
+        "memory",
+    ],
+)
+
+
+class IoJournal:
+    """Record of every value a machine read and wrote
+
+    Alongside the values, a checkpoint of the machine's full state is kept
+    every `checkpointInterval` inputs, and the number of outputs at each
+    `drain`, so a replay ends with the same outputs waiting to be read.
+    """
+
+    def __init__(self, imageHash, checkpointInterval=1000):
+        self.imageHash = imageHash
+        self.checkpointInterval = checkpointInterval
+
+        # Inputs consumed and outputs emitted, in order
+        self.inputs = []
+        self.outputs = []
+
+        # (inputs, outputs) recorded at each drain
+        self.drains = []
+
+        # Checkpoints in order of the number of inputs they were taken at
+        self.checkpoints = []
+
+    def copy(self):
+        """Copy of the journal that can be recorded to separately"""
+        journal, checkpoint = self.truncated(len(self.inputs))
+        journal.inputs = list(self.inputs)
+        journal.outputs = list(self.outputs)
+        journal.drains = list(self.drains)
+        return journal
+
+    def truncated(self, inputCount):
+        """Copy of the journal up to the checkpoint at or before an input
+
+        Returns the copy along with the checkpoint, or None if there isn't
+        one.
+        """
+        index = bisect.bisect_right(
+            [checkpoint.inputCount for checkpoint in self.checkpoints],
+            inputCount,
+        )
+        checkpoint = self.checkpoints[index - 1] if index else None
+        inputCount = checkpoint.inputCount if checkpoint else 0
+        outputCount = checkpoint.outputCount if checkpoint else 0
+
+        journal = IoJournal(self.imageHash, self.checkpointInterval)
+        journal.inputs = self.inputs[:inputCount]
+        journal.outputs = self.outputs[:outputCount]
+        journal.drains = [
+            drain for drain in self.drains if drain[0] <= inputCount
+        ]
+        journal.checkpoints = self.checkpoints[:index]
+        return journal, checkpoint
+
+    def save(self, path):
+        """Write the journal to a compressed file"""
+        with gzip.open(path, "wb") as file:
+            pickle.dump(self, file, protocol=pickle.HIGHEST_PROTOCOL)
+
+    @staticmethod
+    def load(path):
+        """Read a journal written by `save`"""
+        with gzip.open(path, "rb") as file:
+            return pickle.load(file)
+
+
+class JournaledIntCodeMachine(IntCodeMachine):
+    """IntCode machine that records its I/O to an IoJournal
+
+    The first checkpoint is taken when the machine first executes, so any
+    patches made to memory before then are part of it. A run can be picked
+    up again from its journal with `replay`.
+    """
+
+    def __init__(self, instructions, checkpointInterval=1000):
+        self.checkpointInterval = checkpointInterval
+        super().__init__(instructions)
+
+    def reset(self):
+        # A reset machine starts a new journal
+        super().reset()
+        self.journal = IoJournal(self.image.hash, self.checkpointInterval)
+
+    def fork(self):
+        # The child gets its own copy of the journal so far
+        child = super().fork()
+        child.journal = self.journal.copy()
+        return child
+
+    def checkpoint(self):
+        # Capture the full state, sharing memory pages until written
+        journal = self.journal
+        journal.checkpoints.append(
+            Checkpoint(
+                len(journal.inputs),
+                len(journal.outputs),
+                self.state,
+                self.position,
+                self.relativeBase,
+                self.memory.fork(),
+            )
+        )
+
+    def drain(self):
+        values = super().drain()
+        self.journal.drains.append(
+            (len(self.journal.inputs), len(self.journal.outputs))
+        )
+        return values
+
+    def opInput(self, modeA, modeB, modeC):
+        # Checkpoint every so many inputs, just before reading the next one,
+        # unless a replay was just restored from a checkpoint right here
+        journal = self.journal
+        if self.inputValues:
+            value = self.inputValues[0]
+            count = len(journal.inputs)
+            if (
+                count
+                and count % journal.checkpointInterval == 0
+                and not (
+                    journal.checkpoints
+                    and journal.checkpoints[-1].inputCount == count
+                )
+            ):
+                self.checkpoint()
+        if super().opInput(modeA, modeB, modeC):
+            return True
+        journal.inputs.append(value)
+
+    def emit(self, value):
+        super().emit(value)
+        self.journal.outputs.append(value)
+
+    # The journaling input handler replaces the plain one
+    dispatchTable = {
+        **IntCodeMachine.dispatchTable,
+        3: opInput,
+    }
+    instructionTable = buildInstructionTable(dispatchTable)
+
+    def run(self):
+        # The generator keeps everything in locals and does its own I/O, so
+        # a run through it would record nothing
+        raise TypeError(
+            f"{type(self).__name__} can't be run as a generator, use execute()"
+        )
+
+    def execute(self, maxSteps=None):
+        # The first checkpoint holds memory as it was when the run started
+        if not self.journal.checkpoints:
+            self.checkpoint()
+        return super().execute(maxSteps)
+
+    @classmethod
+    def replay(cls, instructions, journal, inputCount=None):
+        """Create a machine in the state a journal was recorded in
+
+        The machine is restored from the last checkpoint before
+        `inputCount` inputs, defaulting to all of them, and runs with the
+        inputs recorded after it until it needs more input or halts. It
+        keeps recording to a copy of the journal, so a session can carry on
+        from where it left off.
+        """
+        machine = cls(instructions, journal.checkpointInterval)
+        if machine.image.hash != journal.imageHash:
+            raise ValueError("Journal was recorded from a different program")
+        if inputCount is None:
+            inputCount = len(journal.inputs)
+
+        # Jump to the nearest checkpoint, if there is one
+        machine.journal, checkpoint = journal.truncated(inputCount)
+        if checkpoint is not None:
+            machine.restore(
+                MachineSnapshot(
+                    checkpoint.memory.share(),
+                    checkpoint.state,
+                    checkpoint.position,
+                    checkpoint.relativeBase,
+                    (),
+                    (),
+                )
+            )
+
+        # Re-execute the tail, checking it does what it did the first time
+        machine.feed(journal.inputs[len(machine.journal.inputs) : inputCount])
+        if machine.state is not IntCodeMachineState.HALTED:
+            machine.execute()
+        outputs = machine.journal.outputs
+        if outputs != journal.outputs[: len(outputs)]:
+            raise RuntimeError("Replay diverged from the journal")
+
+        # Leave the outputs since the last drain waiting, as they were
+        lastDrain = 0
+        for inputs, drained in journal.drains:
+            if inputs <= inputCount:
+                lastDrain = drained
+        machine.journal.drains = [
+            drain for drain in journal.drains if drain[0] <= inputCount
+        ]
+        machine.outputValues = collections.deque(outputs[lastDrain:])
+        return machine
+
+
+# Reads a count and spins down from it, then outputs how many counts it has
+# read, forever
+spinProgram = (
+    "3,21,1006,21,12,1001,21,-1,21,1105,1,2,1001,22,1,22,4,22,1105,1,0,0,0"
+)
+
+
+@click.command()
+@click.option("--inputs", "-n", default=2000)
+@click.option("--work", "-w", default=200)
+@click.option("--interval", "-i", default=100)
+def main(inputs, work, interval):
+    """Compare replaying a journal against running the session again"""
+    # Record a long session
+    start = time.perf_counter()
+    machine = JournaledIntCodeMachine(spinProgram, interval)
+    for i in range(inputs):
+        machine.feed([work])
+        machine.execute()
+        machine.drain()
+    recorded = time.perf_counter() - start
+    print(
+        f"recorded {inputs} inputs in {recorded:.3f}s,",
+        f"{len(machine.journal.checkpoints)} checkpoints",
+    )
+
+    # Replay it from the last checkpoint, and from scratch without any
+    uncheckpointed = machine.journal.copy()
+    uncheckpointed.checkpoints.clear()
+    for name, journal in [
+        ("checkpoint", machine.journal),
+        ("scratch", uncheckpointed),
+    ]:
+        start = time.perf_counter()
+        replayed = JournaledIntCodeMachine.replay(spinProgram, journal)
+        print(
+            f"replayed from {name} in {time.perf_counter() - start:.3f}s,",
+            f"{replayed.state.name}",
+        )
+
+
+# Execute cli function on main
+if __name__ == "__main__":
+    main()
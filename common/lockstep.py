@@ -0,0 +1,275 @@
+# stdlib imports
+import random
+import time
+
+# vendor imports
+import click
+import numpy
+
+# local imports
+from common.intcode import IntCodeMachine, decodeTable
+
+# Reads n and outputs the sum of n, n - 1, ..., 1, so every lane runs its
+# loop a different number of times
+sumProgram = "3,20,1101,0,0,21,1,21,20,21,1001,20,-1,20,1005,20,6,4,21,99,0,0"
+
+# Every legal instruction word, to check decoded words against
+legalWords = numpy.array(sorted(decodeTable), dtype=numpy.int64)
+
+
+class LockstepIntCodeMachines:
+    """N copies of one IntCode program stepped together with NumPy
+
+    Every lane's memory is a row of one 2-D int64 array, and the registers
+    are vectors with one entry per lane. Each step decodes the current
+    instruction of every running lane and executes the lanes sharing an
+    opcode together, so lanes that have diverged onto different code are
+    just masked out of each other's groups. Lanes that halt, or that wait
+    for input, are retired until they're fed more input.
+
+    Values are held as int64, so unlike IntCodeMachine, arithmetic that
+    overflows wraps around silently.
+    """
+
+    def __init__(self, instructions, count):
+        # Every lane starts with the same memory image
+        image = numpy.array(
+            list(map(lambda op: int(op), instructions.strip().split(","))),
+            dtype=numpy.int64,
+        )
+        self.count = count
+        self.memory = numpy.tile(image, (count, 1))
+
+        # Starting register values
+        self.lanes = numpy.arange(count)
+        self.position = numpy.zeros(count, dtype=numpy.int64)
+        self.relativeBase = numpy.zeros(count, dtype=numpy.int64)
+
+        # Lanes that have halted, and those blocked waiting for input
+        self.halted = numpy.zeros(count, dtype=bool)
+        self.waiting = numpy.zeros(count, dtype=bool)
+
+        # Input and output values per lane, with the number of each used
+        self.inputValues = numpy.zeros((count, 0), dtype=numpy.int64)
+        self.inputCount = numpy.zeros(count, dtype=numpy.int64)
+        self.inputCursor = numpy.zeros(count, dtype=numpy.int64)
+        self.outputValues = numpy.zeros((count, 0), dtype=numpy.int64)
+        self.outputCount = numpy.zeros(count, dtype=numpy.int64)
+
+    def feed(self, values, lanes=None):
+        """Queue up the same number of input values for each lane
+
+        `values` has a row of input values for each of `lanes`, which
+        defaults to every lane.
+        """
+        lanes = self.lanes if lanes is None else numpy.asarray(lanes)
+        values = numpy.asarray(values, dtype=numpy.int64).reshape(
+            len(lanes), -1
+        )
+
+        # Make room for the new values after those already queued
+        counts = self.inputCount[lanes]
+        self.inputValues = self.grow(
+            self.inputValues, int(counts.max(initial=0)) + values.shape[1]
+        )
+        columns = counts[:, None] + numpy.arange(values.shape[1])
+        self.inputValues[lanes[:, None], columns] = values
+        self.inputCount[lanes] += values.shape[1]
+
+        # Lanes with input to read are no longer waiting
+        self.waiting[lanes] = False
+
+    def drain(self):
+        """Remove and return each lane's captured output values"""
+        values = [
+            row[:count].tolist()
+            for row, count in zip(self.outputValues, self.outputCount)
+        ]
+        self.outputCount[:] = 0
+        return values
+
+    @staticmethod
+    def grow(values, width):
+        # Widen a 2-D array with zero columns, at least doubling it
+        if width <= values.shape[1]:
+            return values
+        width = max(width, 2 * values.shape[1])
+        grown = numpy.zeros((values.shape[0], width), dtype=numpy.int64)
+        grown[:, : values.shape[1]] = values
+        return grown
+
+    def readParams(self, lanes, positions, words, count):
+        """Resolve the first `count` params of each lane's instruction"""
+        values = []
+        for i in range(count):
+            mode = words // (100 * 10**i) % 10
+            param = self.memory[lanes, positions + 1 + i]
+
+            # Position and relative mode params are addresses to read from,
+            # where anything past the end of memory reads as zero
+            address = param + numpy.where(
+                mode == 2, self.relativeBase[lanes], 0
+            )
+            address = numpy.where(mode == 1, 0, address)
+            if (address < 0).any():
+                raise RuntimeError("Negative memory address")
+            inside = address < self.memory.shape[1]
+            value = numpy.where(
+                inside,
+                self.memory[lanes, numpy.where(inside, address, 0)],
+                0,
+            )
+            values.append(numpy.where(mode == 1, param, value))
+        return values
+
+    def writeParam(self, lanes, positions, words, offset, values):
+        """Write a value through the param at `offset` of each instruction"""
+        mode = words // (10 * 10**offset) % 10
+        address = self.memory[lanes, positions + offset]
+        address += numpy.where(mode == 2, self.relativeBase[lanes], 0)
+        if (address < 0).any():
+            raise RuntimeError("Negative memory address")
+
+        # Memory is grown for every lane to fit the highest address
+        self.memory = self.grow(self.memory, int(address.max(initial=-1)) + 1)
+        self.memory[lanes, address] = values
+
+    def step(self, lanes):
+        """Execute the current instruction of every lane given
+
+        Returns True if any lane stopped running.
+        """
+        positions = self.position[lanes]
+        words = self.memory[lanes, positions]
+        stopped = False
+
+        # Make sure every instruction is legal before executing any of them
+        legal = numpy.isin(words, legalWords)
+        if not legal.all():
+            lane = lanes[~legal][0]
+            word = self.memory[lane, self.position[lane]]
+            raise RuntimeError(
+                f"Unknown opcode {word % 100} ({word}) at position {self.position[lane]} in lane {lane}"
+            )
+
+        # Execute each opcode for all the lanes that share it
+        opcodes = words % 100
+        for opcode in numpy.unique(opcodes):
+            opcode = int(opcode)
+            if len(opcodes) == 1 or (opcodes == opcode).all():
+                group, groupPositions, groupWords = lanes, positions, words
+            else:
+                mask = opcodes == opcode
+                group = lanes[mask]
+                groupPositions = positions[mask]
+                groupWords = words[mask]
+
+            # Code 1, 2, 7 and 8 are arithmetic and comparison
+            if opcode in (1, 2, 7, 8):
+                a, b = self.readParams(group, groupPositions, groupWords, 2)
+                if opcode == 1:
+                    value = a + b
+                elif opcode == 2:
+                    value = a * b
+                elif opcode == 7:
+                    value = (a < b).astype(numpy.int64)
+                else:
+                    value = (a == b).astype(numpy.int64)
+                self.writeParam(group, groupPositions, groupWords, 3, value)
+                self.position[group] += 4
+
+            # Code 3 is input, for the lanes that have any waiting
+            elif opcode == 3:
+                ready = self.inputCursor[group] < self.inputCount[group]
+                if not ready.all():
+                    self.waiting[group[~ready]] = True
+                    stopped = True
+                group = group[ready]
+                groupPositions = groupPositions[ready]
+                groupWords = groupWords[ready]
+                value = self.inputValues[group, self.inputCursor[group]]
+                self.inputCursor[group] += 1
+                self.writeParam(group, groupPositions, groupWords, 1, value)
+                self.position[group] += 2
+
+            # Code 4 is output
+            elif opcode == 4:
+                (value,) = self.readParams(
+                    group, groupPositions, groupWords, 1
+                )
+                counts = self.outputCount[group]
+                self.outputValues = self.grow(
+                    self.outputValues, int(counts.max(initial=-1)) + 1
+                )
+                self.outputValues[group, counts] = value
+                self.outputCount[group] += 1
+                self.position[group] += 2
+
+            # Code 5 and 6 are conditional jumps
+            elif opcode in (5, 6):
+                a, b = self.readParams(group, groupPositions, groupWords, 2)
+                jump = a != 0 if opcode == 5 else a == 0
+                self.position[group] = numpy.where(jump, b, groupPositions + 3)
+
+            # Code 9 adjusts the relative base
+            elif opcode == 9:
+                (value,) = self.readParams(
+                    group, groupPositions, groupWords, 1
+                )
+                self.relativeBase[group] += value
+                self.position[group] += 2
+
+            # Code 99 retires the lane
+            else:
+                self.halted[group] = True
+                stopped = True
+
+        return stopped
+
+    def execute(self):
+        """Run every lane until it halts or runs out of input"""
+        lanes = numpy.flatnonzero(~self.halted & ~self.waiting)
+        while len(lanes):
+            # Only look for retired lanes when some have stopped
+            if self.step(lanes):
+                lanes = numpy.flatnonzero(~self.halted & ~self.waiting)
+
+
+@click.command()
+@click.option("--lanes", "-n", default=10000)
+@click.option("--limit", "-l", default=100)
+def main(lanes, limit):
+    """Compare the lockstep engine against looping over IntCodeMachine"""
+    # Each lane sums a random number of values, so they diverge and retire
+    # at different times
+    generator = random.Random(0)
+    inputs = [generator.randrange(1, limit) for i in range(lanes)]
+
+    start = time.perf_counter()
+    machines = LockstepIntCodeMachines(sumProgram, lanes)
+    machines.feed(inputs)
+    machines.execute()
+    lockstepOutputs = machines.drain()
+    lockstepElapsed = time.perf_counter() - start
+
+    start = time.perf_counter()
+    loopOutputs = []
+    for value in inputs:
+        machine = IntCodeMachine(sumProgram)
+        machine.feed([value])
+        machine.execute()
+        loopOutputs.append(machine.drain())
+    loopElapsed = time.perf_counter() - start
+
+    assert lockstepOutputs == loopOutputs
+    timings = [("lockstep", lockstepElapsed), ("loop", loopElapsed)]
+    for name, elapsed in timings:
+        print(
+            f"{name}: {lanes} machines, {elapsed:.3f}s,",
+            f"{lanes / elapsed:.0f} machines/s",
+        )
+
+
+# Execute cli function on main
+if __name__ == "__main__":
+    main()
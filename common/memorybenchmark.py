@@ -0,0 +1,66 @@
+# stdlib imports
+import random
+import time
+import tracemalloc
+
+# vendor imports
+import click
+
+# local imports
+from common.intcode import IntCodeMachine, densePageLimit, pageShift
+
+# Reads an address, stores 7 there through the relative base, outputs it
+# back and restores the relative base, until it runs out of input
+scatterProgram = "3,19,9,19,21101,7,0,0,204,0,1002,19,-1,19,9,19,1105,1,0,0"
+
+
+def scatterAddresses(count, spread, seed=0):
+    """Random addresses, all well clear of the program itself"""
+    generator = random.Random(seed)
+    return [generator.randrange(1 << pageShift, spread) for i in range(count)]
+
+
+def measure(addresses):
+    """Run the scatter program over some addresses, returning the elapsed
+    time, peak memory allocated and the number of pages touched
+    """
+    tracemalloc.start()
+    start = time.perf_counter()
+
+    machine = IntCodeMachine(scatterProgram)
+    machine.feed(addresses)
+    machine.execute()
+
+    elapsed = time.perf_counter() - start
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    # Every write should read back as the value written
+    assert list(machine.drain()) == [7] * len(addresses)
+    return elapsed, peak, len(machine.memory.allocatedPages())
+
+
+@click.command()
+@click.option("--count", "-n", default=1000)
+@click.option("--seed", "-s", default=0)
+def main(count, seed):
+    """Measure the memory use of writes to widely scattered addresses"""
+    for spreadBits in (16, 24, 32, 48, 63):
+        spread = 1 << spreadBits
+        elapsed, peak, pages = measure(scatterAddresses(count, spread, seed))
+
+        # Element-wise growth would have needed the whole range up to the
+        # highest address, as 8 bytes per value at the very least
+        dense = 8 * spread
+        print(
+            f"2**{spreadBits}: {count} writes, {elapsed * 1e3:.1f}ms,",
+            f"{pages} pages, peak {peak / 1024:.0f}KB",
+            f"(dense at least {dense / 1024:.0f}KB)",
+        )
+
+    print(f"pages beyond {densePageLimit} are stored sparsely")
+
+
+# Execute cli function on main
+if __name__ == "__main__":
+    main()
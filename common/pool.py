@@ -0,0 +1,185 @@
+# stdlib imports
+import collections
+import multiprocessing
+import time
+from multiprocessing import shared_memory
+
+# vendor imports
+import click
+
+# local imports
+from common.intcode import IntCodeMachine, ProgramImage, loadImage, pageSize
+from common.runcache import RunResult
+from common.samples import loopProgram
+
+# A job for the pool: the input values fed to the machine, any patches made
+# to its memory beforehand and the memory addresses read once it stops
+PoolJob = collections.namedtuple(
+    "PoolJob", ["inputValues", "patches", "reads"], defaults=((), None, ())
+)
+
+# Machine each worker process runs its jobs on, and the shared memory its
+# image is mapped from
+workerMachine = None
+workerMemory = None
+
+
+def startWorker(engine, memoryName, length, values):
+    # Map the image read-only from shared memory, or parse it from the values
+    # passed in if it couldn't be shared
+    global workerMachine, workerMemory
+    if memoryName is not None:
+        workerMemory = shared_memory.SharedMemory(memoryName)
+        padded = -(-length // pageSize) * pageSize
+        view = workerMemory.buf[: 8 * padded].cast("q").toreadonly()
+        image = ProgramImage.fromPages(
+            [
+                view[start : start + pageSize]
+                for start in range(0, padded, pageSize)
+            ],
+            length,
+        )
+    else:
+        image = ProgramImage(",".join(map(str, values)))
+    workerMachine = engine(image)
+
+
+def runJob(job):
+    # Every job starts from the pristine image, so the worker's one machine
+    # is just reset rather than created again
+    inputValues, patches, reads = job
+    machine = workerMachine
+    machine.reset()
+    for address, value in (patches or {}).items():
+        machine.memory[address] = value
+    machine.feed(inputValues)
+    machine.execute()
+    return RunResult(
+        tuple(machine.drain()),
+        machine.state,
+        tuple(machine.memory[address] for address in reads),
+    )
+
+
+def callWithMachine(task):
+    # Hand the worker's machine to a function, along with its argument
+    function, argument = task
+    return function(workerMachine, argument)
+
+
+class IntCodePool:
+    """Runs IntCode jobs for one program across a pool of worker processes
+
+    The program image is copied once into shared memory, which every worker
+    maps read-only as the pages of its machine's image, copying a page only
+    when a job writes to it. Only each job and its RunResult cross between
+    processes. An image holding values too big for 64 bits can't be shared
+    that way, so it's handed to each worker once as it starts instead.
+    """
+
+    def __init__(self, program, processes=None, engine=IntCodeMachine):
+        image = loadImage(program)
+        pages = image.pages[0]
+
+        # Copy the image's pages into shared memory when they're all arrays
+        self.memory = None
+        if all(isinstance(page, memoryview) for page in pages):
+            data = b"".join(page.tobytes() for page in pages)
+            self.memory = shared_memory.SharedMemory(
+                create=True, size=max(len(data), 8)
+            )
+            self.memory.buf[: len(data)] = data
+            initArgs = (engine, self.memory.name, len(image), None)
+        else:
+            initArgs = (engine, None, len(image), image.memory[: len(image)])
+
+        # Start a worker per core by default
+        self.processes = processes or multiprocessing.cpu_count()
+        self.pool = multiprocessing.Pool(self.processes, startWorker, initArgs)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exception):
+        self.close()
+
+    def run(self, inputValues=(), patches=None, reads=()):
+        """Run a single job on one of the workers and return its result"""
+        return self.pool.apply(
+            runJob, (PoolJob(tuple(inputValues), patches, tuple(reads)),)
+        )
+
+    def map(self, jobs, chunkSize=64):
+        """Run every job, returning their results in order
+
+        Jobs are PoolJobs, or tuples of the same values, and are sent to the
+        workers `chunkSize` at a time.
+        """
+        return self.pool.map(runJob, jobs, chunkSize)
+
+    def imap(self, jobs, chunkSize=64):
+        """Run every job, yielding their results in order as they're ready
+
+        A search can stop at the first result it's after, and closing the
+        pool then abandons the jobs that are left.
+        """
+        return self.pool.imap(runJob, jobs, chunkSize)
+
+    def imapCalls(self, function, arguments):
+        """Call `function(machine, argument)` on the workers for each argument
+
+        The machine is the worker's own, left however the last call on that
+        worker left it, and the results are yielded in order. `function`
+        has to be picklable, so it must be defined at the top level of a
+        module.
+        """
+        return self.pool.imap(
+            callWithMachine, ((function, argument) for argument in arguments)
+        )
+
+    def close(self):
+        """Stop the workers and free the shared image"""
+        self.pool.terminate()
+        self.pool.join()
+        if self.memory is not None:
+            self.memory.close()
+            self.memory.unlink()
+            self.memory = None
+
+
+@click.command()
+@click.option("--jobs", "-n", default=2000)
+@click.option("--work", "-w", default=500)
+@click.option("--processes", "-p", type=int, default=None)
+def main(jobs, work, processes):
+    """Compare running a batch of jobs in this process against a pool"""
+    batch = [PoolJob([work + i % 100]) for i in range(jobs)]
+
+    # Run the batch one job after another on a single machine
+    start = time.perf_counter()
+    machine = IntCodeMachine(loopProgram)
+    expected = []
+    for job in batch:
+        machine.reset()
+        machine.feed(job.inputValues)
+        machine.execute()
+        expected.append(machine.drain())
+    serial = time.perf_counter() - start
+    print(f"serial: {jobs} jobs in {serial:.3f}s")
+
+    # Then spread it across the pool, including the time to start it
+    start = time.perf_counter()
+    with IntCodePool(loopProgram, processes) as pool:
+        results = pool.map(batch)
+    pooled = time.perf_counter() - start
+    print(
+        f"pool: {jobs} jobs in {pooled:.3f}s,",
+        f"{serial / pooled:.2f}x on {pool.processes} processes",
+    )
+    if [list(result.outputs) for result in results] != expected:
+        raise RuntimeError("Pool results differ from the serial run")
+
+
+# Execute cli function on main
+if __name__ == "__main__":
+    main()
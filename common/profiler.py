@@ -0,0 +1,263 @@
+# stdlib imports
+import collections
+import json
+import sys
+import time
+
+# vendor imports
+import click
+
+# local imports
+from common.intcode import (
+    IntCodeMachine,
+    IntCodeMachineState,
+    buildInstructionTable,
+    decodeTable,
+    opcodeNames,
+    pageMask,
+    pageShift,
+)
+
+
+class ProfiledIntCodeMachine(IntCodeMachine):
+    """IntCode machine that records where its execution time goes
+
+    Counts every instruction executed by opcode and by address, every
+    memory read and write by address, and the wall time and number of
+    instructions between I/O events. Profiling is opted into by using this
+    class, so a plain IntCodeMachine pays nothing for it.
+    """
+
+    def __init__(self, instructions):
+        super().__init__(instructions)
+        self.resetProfile()
+
+    def resetProfile(self):
+        # Instruction counts by instruction word and by address
+        self.wordCounts = collections.Counter()
+        self.addressHits = collections.Counter()
+
+        # Memory reads and writes by address
+        self.memoryReads = collections.Counter()
+        self.memoryWrites = collections.Counter()
+
+        # Each I/O event as (kind, position, seconds, instructions) since the
+        # previous one
+        self.ioEvents = []
+        self.lastIoTime = time.perf_counter()
+        self.lastIoCount = 0
+
+        # Totals over every call to execute
+        self.instructionCount = 0
+        self.elapsed = 0.0
+
+    def fork(self):
+        # A fork starts its own profile
+        child = super().fork()
+        child.resetProfile()
+        return child
+
+    def readParam(self, offset, paramMode):
+        # Record the address being read, unless the param is immediate
+        if paramMode != 1:
+            address = self.memory[self.position + offset]
+            if paramMode == 2:
+                address += self.relativeBase
+            self.memoryReads[address] += 1
+        return super().readParam(offset, paramMode)
+
+    def writeParam(self, offset, paramMode, value):
+        address = super().writeParam(offset, paramMode, value)
+        self.memoryWrites[address] += 1
+        return address
+
+    def recordIo(self, kind, position):
+        # Time and instructions since the last I/O event
+        now = time.perf_counter()
+        self.ioEvents.append(
+            (
+                kind,
+                position,
+                now - self.lastIoTime,
+                self.instructionCount - self.lastIoCount,
+            )
+        )
+        self.lastIoTime = now
+        self.lastIoCount = self.instructionCount
+
+    def opInput(self, modeA, modeB, modeC):
+        position = self.position
+        if super().opInput(modeA, modeB, modeC):
+            return True
+        self.recordIo("input", position)
+
+    def opOutput(self, modeA, modeB, modeC):
+        position = self.position
+        super().opOutput(modeA, modeB, modeC)
+        self.recordIo("output", position)
+
+    # The profiled handlers replace the plain ones
+    dispatchTable = {
+        **IntCodeMachine.dispatchTable,
+        3: opInput,
+        4: opOutput,
+    }
+    instructionTable = buildInstructionTable(dispatchTable)
+
+    def run(self):
+        # The generator keeps everything in locals and does its own I/O, so
+        # a run through it would go unprofiled
+        raise TypeError(
+            f"{type(self).__name__} can't be run as a generator, use execute()"
+        )
+
+    def execute(self, maxSteps=None):
+        # Make surethe machine isn't already halted
+        if self.state is IntCodeMachineState.HALTED:
+            raise RuntimeError("Machine is already halted")
+
+        # Same loop as the plain interpreter, counting each instruction
+        instructionTable = self.instructionTable
+        pages = self.memory.pages
+        wordCounts = self.wordCounts
+        addressHits = self.addressHits
+        budget = sys.maxsize if maxSteps is None else maxSteps
+        start = time.perf_counter()
+        try:
+            for step in range(budget):
+                position = self.position
+                try:
+                    instruction = pages[position >> pageShift][
+                        position & pageMask
+                    ]
+                except IndexError:
+                    instruction = self.memory[position]
+                decoded = instructionTable.get(instruction)
+
+                # Unknown opcode means there was an error
+                if decoded is None:
+                    raise RuntimeError(
+                        f"Unknown opcode {self.splitInstruction(instruction)[0]} ({instruction}) at position {self.position}"
+                    )
+
+                # Count the instruction, then execute it
+                wordCounts[instruction] += 1
+                addressHits[position] += 1
+                self.instructionCount += 1
+                handler, paramModeA, paramModeB, paramModeC = decoded
+                if handler(self, paramModeA, paramModeB, paramModeC):
+                    # Waiting for input doesn't count as running the input
+                    if self.state is IntCodeMachineState.WAITING_FOR_INPUT:
+                        wordCounts[instruction] -= 1
+                        addressHits[position] -= 1
+                        self.instructionCount -= 1
+                    break
+            else:
+                self.state = IntCodeMachineState.BUDGET_EXHAUSTED
+        finally:
+            self.elapsed += time.perf_counter() - start
+
+    def opcodeCounts(self):
+        """Number of instructions executed for each opcode"""
+        counts = collections.Counter()
+        for word, count in self.wordCounts.items():
+            counts[opcodeNames[decodeTable[word][0]]] += count
+        return counts
+
+    def profile(self):
+        """Everything recorded so far, in a form that can be dumped as JSON"""
+        return {
+            "instructions": self.instructionCount,
+            "elapsed": self.elapsed,
+            "opcodes": dict(self.opcodeCounts().most_common()),
+            "addresses": {
+                str(address): count
+                for address, count in sorted(self.addressHits.items())
+            },
+            "reads": {
+                str(address): count
+                for address, count in sorted(self.memoryReads.items())
+            },
+            "writes": {
+                str(address): count
+                for address, count in sorted(self.memoryWrites.items())
+            },
+            "io": [
+                {
+                    "kind": kind,
+                    "position": position,
+                    "seconds": seconds,
+                    "instructions": instructions,
+                }
+                for kind, position, seconds, instructions in self.ioEvents
+            ],
+        }
+
+    def exportJson(self, file):
+        """Write the profile to an open file as JSON"""
+        json.dump(self.profile(), file, indent=2)
+
+    def report(self, limit=10):
+        """Text report of the hottest opcodes, code and memory addresses"""
+        total = max(self.instructionCount, 1)
+        lines = [
+            f"{self.instructionCount} instructions in {self.elapsed:.3f}s"
+            f" ({self.instructionCount / max(self.elapsed, 1e-9):.0f}/s)",
+            "",
+            "opcodes:",
+        ]
+        for name, count in self.opcodeCounts().most_common():
+            lines.append(
+                f"  {name:>5} {count:>12} {100 * count / total:6.2f}%"
+            )
+
+        # Show the instruction currently at each hot address
+        lines += ["", f"hottest {limit} addresses:"]
+        for address, count in self.addressHits.most_common(limit):
+            decoded = decodeTable.get(self.memory[address])
+            name = opcodeNames[decoded[0]] if decoded else "?"
+            lines.append(
+                f"  {address:>8} {name:>5} {count:>12}"
+                f" {100 * count / total:6.2f}%"
+            )
+
+        for title, counter in [
+            ("reads", self.memoryReads),
+            ("writes", self.memoryWrites),
+        ]:
+            lines += ["", f"most {title}:"]
+            for address, count in counter.most_common(limit):
+                lines.append(f"  {address:>8} {count:>12}")
+
+        # Summarise the gaps between I/O events
+        if self.ioEvents:
+            gaps = [seconds for kind, position, seconds, i in self.ioEvents]
+            lines += [
+                "",
+                f"{len(self.ioEvents)} I/O events, gaps of"
+                f" {1e3 * sum(gaps) / len(gaps):.3f}ms on average,"
+                f" {1e3 * max(gaps):.3f}ms at most",
+            ]
+
+        return "\n".join(lines)
+
+
+@click.command()
+@click.argument("input_file", type=click.File("r"))
+@click.option("--input", "-i", "inputValues", type=int, multiple=True)
+@click.option("--json", "-j", "jsonFile", type=click.File("w"))
+@click.option("--limit", "-l", default=10)
+def main(input_file, inputValues, jsonFile, limit):
+    """Profile an IntCode program run with the given input values"""
+    machine = ProfiledIntCodeMachine(input_file.read())
+    machine.feed(inputValues)
+    machine.execute()
+
+    print(machine.report(limit))
+    if jsonFile is not None:
+        machine.exportJson(jsonFile)
+
+
+# Execute cli function on main
+if __name__ == "__main__":
+    main()
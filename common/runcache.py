@@ -0,0 +1,186 @@
+# stdlib imports
+import collections
+import hashlib
+import json
+import os
+
+# local imports
+from common.intcode import (
+    IntCodeMachine,
+    IntCodeMachineState,
+    cacheDirectory,
+    loadImage,
+)
+
+# Runs are stored on disk next to the compiled programs by default
+runDirectory = cacheDirectory / "runs"
+
+# Outcome of a run: its outputs, the state it stopped in, and the values of
+# any memory addresses asked for once it stopped
+RunResult = collections.namedtuple("RunResult", ["outputs", "state", "values"])
+
+
+class RunCache:
+    """Remembers the results of running IntCode programs on given inputs
+
+    Runs are keyed by the program's hash, the input values, any patches made
+    to memory beforehand and the memory addresses read afterwards. The most
+    recent `maxEntries` results are kept in memory. With a `directory`,
+    results are also stored on disk, so later processes can reuse them, and
+    the least recently used files are deleted once they add up to more than
+    `maxBytes`.
+    """
+
+    def __init__(
+        self,
+        maxEntries=4096,
+        directory=None,
+        maxBytes=64 << 20,
+        engine=IntCodeMachine,
+    ):
+        self.maxEntries = maxEntries
+        self.directory = directory
+        self.maxBytes = maxBytes
+        self.engine = engine
+
+        # Results in least to most recently used order
+        self.results = collections.OrderedDict()
+
+        # Counters of where each run's result came from
+        self.hits = 0
+        self.diskHits = 0
+        self.misses = 0
+
+        # Total size of the files on disk. Caching is best effort, so a
+        # directory that can't be created just isn't used.
+        self.diskBytes = 0
+        if directory is not None:
+            try:
+                directory.mkdir(parents=True, exist_ok=True)
+                self.diskBytes = sum(
+                    path.stat().st_size for path in directory.glob("*.json")
+                )
+            except OSError:
+                self.directory = None
+
+    def run(self, program, inputValues=(), patches=None, reads=()):
+        """Run a program to completion, or return the cached result
+
+        `program` is text or a ProgramImage, `patches` maps memory addresses
+        to values set before the run, and `reads` lists addresses whose final
+        values are returned.
+        """
+        image = loadImage(program)
+        key = (
+            image.hash,
+            tuple(inputValues),
+            tuple(sorted((patches or {}).items())),
+            tuple(reads),
+        )
+
+        # Look in memory first
+        result = self.results.get(key)
+        if result is not None:
+            self.results.move_to_end(key)
+            self.hits += 1
+            return result
+
+        # Then on disk
+        result = self.load(key)
+        if result is not None:
+            self.diskHits += 1
+        else:
+            self.misses += 1
+            result = self.execute(image, key)
+            self.save(key, result)
+
+        # Remember it, forgetting the least recently used result if full
+        self.results[key] = result
+        if len(self.results) > self.maxEntries:
+            self.results.popitem(last=False)
+        return result
+
+    def execute(self, image, key):
+        # Run a fresh machine until it halts or runs out of input
+        programHash, inputValues, patches, reads = key
+        machine = self.engine(image)
+        for address, value in patches:
+            machine.memory[address] = value
+        machine.feed(inputValues)
+        machine.execute()
+        return RunResult(
+            tuple(machine.drain()),
+            machine.state,
+            tuple(machine.memory[address] for address in reads),
+        )
+
+    def path(self, key):
+        # Every run is stored in a file named after the hash of its key
+        name = hashlib.sha256(repr(key).encode()).hexdigest()
+        return self.directory / f"{name}.json"
+
+    def load(self, key):
+        if self.directory is None:
+            return None
+        path = self.path(key)
+        try:
+            stored = json.loads(path.read_text())
+        except (OSError, ValueError):
+            return None
+
+        # Touch the file so eviction sees it was used
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        return RunResult(
+            tuple(stored["outputs"]),
+            IntCodeMachineState[stored["state"]],
+            tuple(stored["values"]),
+        )
+
+    def save(self, key, result):
+        if self.directory is None:
+            return
+
+        # Caching is best effort, so failing to write is not an error
+        path = self.path(key)
+        data = json.dumps(
+            {
+                "outputs": result.outputs,
+                "state": result.state.name,
+                "values": result.values,
+            }
+        )
+        try:
+            temporaryPath = path.with_suffix(f".{os.getpid()}.tmp")
+            temporaryPath.write_text(data)
+            os.replace(temporaryPath, path)
+        except OSError:
+            return
+        self.diskBytes += len(data)
+
+        if self.diskBytes > self.maxBytes:
+            self.evict()
+
+    def evict(self):
+        # Delete the least recently used files until back under the limit,
+        # leaving some room so this doesn't happen on every save
+        files = []
+        for path in self.directory.glob("*.json"):
+            try:
+                stat = path.stat()
+            except OSError:
+                continue
+            files.append((stat.st_mtime, stat.st_size, path))
+        files.sort()
+
+        self.diskBytes = sum(size for mtime, size, path in files)
+        for mtime, size, path in files:
+            if self.diskBytes <= self.maxBytes * 3 // 4:
+                break
+            try:
+                path.unlink()
+            except OSError:
+                continue
+            self.diskBytes -= size
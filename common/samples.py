@@ -0,0 +1,89 @@
+# local imports
+from common.intcode import IntCodeMachine, IntCodeMachineState
+
+# Reads n, then adds up n, n - 1, ..., 1 and outputs the total
+loopProgram = (
+    "3,23,1101,0,0,24,1006,23,20,1,24,23,24,1001,23,-1,23,1105,1,6,4,24,99,0,0"
+)
+
+# Reads n and outputs the nth fibonacci number, recursing on a stack that
+# is addressed through the relative base
+fibonacciProgram = "109,69,203,1,21101,11,0,0,1105,1,14,204,2,99,21207,1,2,3,1206,3,28,21201,1,0,2,2105,1,0,21201,1,-1,5,21101,41,0,4,109,4,1105,1,14,109,-4,21201,6,0,3,21201,1,-2,5,21101,60,0,4,109,4,1105,1,14,109,-4,22201,3,6,2,2105,1,0"
+
+# Outputs every value it reads
+echoProgram = "3,7,4,7,1105,1,0,0"
+
+# Reads n and counts up to it by incrementing the immediate operand of its
+# own first add instruction on every pass
+selfModifyingProgram = (
+    "3,20,1101,0,0,21,1001,3,1,3,1001,20,-1,20,1005,20,2,4,21,99,0,0"
+)
+
+
+def relayProgram(fanIn, rounds):
+    """IntCode program that reads `fanIn` values and outputs, `rounds` times"""
+    # Addresses of the round counter and a scratch cell after the code
+    top = 4
+    halt = top + 2 * fanIn + 9
+    counter = halt + 1
+    scratch = halt + 2
+
+    # Set the counter, read the inputs, output the counter and loop
+    program = [1101, 0, rounds, counter]
+    for i in range(fanIn):
+        program += [3, scratch]
+    program += [4, counter, 1001, counter, -1, counter, 1005, counter, top]
+    program += [99, 0, 0]
+    return ",".join(map(str, program))
+
+
+def buildTopology(topology, size):
+    """List the (source, destination) links and fan-in of a topology"""
+    # Each machine passes to the next one around a ring
+    if topology == "ring":
+        return [(i, (i + 1) % size) for i in range(size)], 1
+
+    # Each machine passes right and down on a square torus
+    side = int(size**0.5)
+    links = []
+    for y in range(side):
+        for x in range(side):
+            links.append((y * side + x, y * side + (x + 1) % side))
+            links.append((y * side + x, ((y + 1) % side) * side + x))
+    return links, 2
+
+
+def runPolling(program, size, links, seeds):
+    """Run a network of machines by executing each in turn until all halt
+
+    `seeds` maps the machines that start with input to the number of zeroes
+    fed to them. Returns False if the network stalls instead.
+    """
+    # Build the machines and seed their inputs
+    machines = [IntCodeMachine(program) for i in range(size)]
+    downstream = [[] for i in range(size)]
+    for source, destination in links:
+        downstream[source].append(machines[destination])
+    for i, count in seeds.items():
+        machines[i].feed([0] * count)
+
+    # Execute every machine in turn until they have all halted, or a whole
+    # sweep neither reads nor writes anything
+    while any(m.state is not IntCodeMachineState.HALTED for m in machines):
+        progressed = False
+        for i, machine in enumerate(machines):
+            if machine.state is IntCodeMachineState.HALTED:
+                continue
+            pending = len(machine.inputValues)
+            machine.execute()
+            outputs = machine.drain()
+            for destinationMachine in downstream[i]:
+                destinationMachine.feed(outputs)
+            if outputs or len(machine.inputValues) != pending:
+                progressed = True
+            elif machine.state is IntCodeMachineState.HALTED:
+                progressed = True
+        if not progressed:
+            return False
+
+    return True
@@ -0,0 +1,289 @@
+# stdlib imports
+import collections
+import time
+
+# vendor imports
+import click
+
+# local imports
+from common.intcode import IntCodeMachine, IntCodeMachineState
+from common.samples import buildTopology, relayProgram, runPolling
+
+
+class IntCodeScheduler:
+    """Runs a set of IntCode machines that talk to each other
+
+    Machines are added under an address. The outputs of a machine are
+    either streamed to the machines and callables it's connected to, or
+    framed into packets whose first value is the address they're routed
+    to. Only machines with input waiting for them are run, each for at most
+    `timeSlice` instructions at a time.
+
+    With a `defaultInput`, a machine that's waiting on an empty inbox is
+    fed that value instead, the way a network card reports no packets.
+    Once it has been fed `idleAfter` default inputs in a row without
+    sending anything it's left alone until something is delivered to it.
+    """
+
+    def __init__(self, timeSlice=None, defaultInput=None, idleAfter=2):
+        self.timeSlice = timeSlice
+        self.defaultInput = defaultInput
+        self.idleAfter = idleAfter
+
+        # Machines by address, and the addresses of those ready to run
+        self.machines = dict()
+        self.ready = collections.deque()
+        self.queued = set()
+
+        # Where each machine's outputs go
+        self.connections = collections.defaultdict(list)
+        self.packetSizes = dict()
+        self.partialPackets = collections.defaultdict(list)
+        self.routes = dict()
+
+        # Default inputs fed to each machine since it last sent anything
+        self.idlePolls = collections.Counter()
+
+        # Packets sent to addresses with no route
+        self.undelivered = []
+
+        # Set by stop() to finish the current run early
+        self.stopped = False
+
+    def add(self, machine, address=None):
+        """Add a machine under an address, defaulting to the next free one"""
+        if address is None:
+            address = len(self.machines)
+        self.machines[address] = machine
+        self.schedule(address)
+        return address
+
+    def connect(self, source, destination):
+        """Stream every output of a machine to another machine's address,
+        or to a callable
+        """
+        self.connections[source].append(destination)
+
+    def frame(self, source, packetSize):
+        """Frame a machine's outputs into packets of `packetSize` values,
+        the first of which is the address to route the packet to
+        """
+        self.packetSizes[source] = packetSize
+
+    def route(self, destination, target):
+        """Route packets for an address to a machine's address or a callable,
+        which is given the whole packet
+        """
+        self.routes[destination] = target
+
+    def stop(self):
+        """Finish the current run once the running machine yields"""
+        self.stopped = True
+
+    def schedule(self, address):
+        # Queue a machine up to run, unless it already is
+        if address not in self.queued:
+            self.queued.add(address)
+            self.ready.append(address)
+
+    def deliver(self, address, values):
+        """Put values in a machine's inbox and wake it up"""
+        machine = self.machines[address]
+        machine.feed(values)
+        self.idlePolls[address] = 0
+        if machine.state is not IntCodeMachineState.HALTED:
+            self.schedule(address)
+
+    def dispatch(self, source, values):
+        # Streamed outputs go to every connection
+        for destination in self.connections.get(source, ()):
+            if callable(destination):
+                for value in values:
+                    destination(value)
+            else:
+                self.deliver(destination, values)
+
+        # Framed outputs are collected into packets and routed
+        packetSize = self.packetSizes.get(source)
+        if packetSize is None:
+            return
+        partial = self.partialPackets[source]
+        partial.extend(values)
+        while len(partial) >= packetSize:
+            packet = tuple(partial[:packetSize])
+            del partial[:packetSize]
+
+            destination = self.routes.get(packet[0], packet[0])
+            if callable(destination):
+                destination(packet)
+            elif destination in self.machines:
+                self.deliver(destination, packet[1:])
+            else:
+                self.undelivered.append(packet)
+
+    def step(self, address):
+        """Run one machine for a time slice and pass its outputs on"""
+        machine = self.machines[address]
+
+        # A machine with nothing to read gets the default input, if there
+        # is one
+        if (
+            machine.state is IntCodeMachineState.WAITING_FOR_INPUT
+            and not machine.inputValues
+            and self.defaultInput is not None
+        ):
+            machine.feed([self.defaultInput])
+            self.idlePolls[address] += 1
+
+        machine.execute(self.timeSlice)
+        outputs = machine.drain()
+        if outputs:
+            self.idlePolls[address] = 0
+            self.dispatch(address, outputs)
+
+        # Run it again later if it still has work to do
+        if machine.state is IntCodeMachineState.HALTED:
+            return
+        if (
+            machine.state is IntCodeMachineState.BUDGET_EXHAUSTED
+            or machine.inputValues
+            or (
+                self.defaultInput is not None
+                and self.idlePolls[address] < self.idleAfter
+            )
+        ):
+            self.schedule(address)
+
+    def run(self, onIdle=None):
+        """Run machines until they've all halted, the network goes idle, or
+        `stop` is called
+
+        Whenever nothing is left to run, `onIdle` is called if it's given,
+        and running carries on if that delivered anything. Returns True if
+        every machine halted.
+        """
+        self.stopped = False
+        while not self.stopped:
+            # Run the next machine that's ready
+            if self.ready:
+                address = self.ready.popleft()
+                self.queued.discard(address)
+                self.step(address)
+                continue
+
+            # Nothing is ready, so the network is idle
+            if onIdle is None:
+                break
+            onIdle()
+            if not self.ready:
+                break
+
+        return all(
+            machine.state is IntCodeMachineState.HALTED
+            for machine in self.machines.values()
+        )
+
+
+# Reads its own address and the address of the next node, then for every
+# (x, y) packet it receives, passes (x - 1, y + 1) on to the next node, or
+# sends y to address 255 once x reaches 0. An input of -1 means no packet.
+packetProgram = "3,44,3,45,3,46,1008,46,-1,48,1005,48,4,3,47,1006,46,35,1001,46,-1,46,1001,47,1,47,4,45,4,46,4,47,1105,1,4,104,255,4,47,104,0,1105,1,4,0,0,0,0,0"
+
+
+def runPacketNetwork(size, tokens, hops, idleAfter):
+    # Every node passes packets to the one before it around a ring, so that
+    # polling in address order gets a single hop done per round
+    scheduler = IntCodeScheduler(defaultInput=-1, idleAfter=idleAfter)
+    results = []
+    for address in range(size):
+        machine = IntCodeMachine(packetProgram)
+        machine.feed([address, (address - 1) % size])
+        scheduler.add(machine, address)
+        scheduler.frame(address, 3)
+    scheduler.route(255, lambda packet: results.append(packet[1]))
+
+    # Start some tokens off, each with a number of hops to make
+    for i in range(tokens):
+        scheduler.deliver(i * size // tokens, [hops, 0])
+    scheduler.run()
+    machines = scheduler.machines.values()
+    return results, sum(machine.instructionCount for machine in machines)
+
+
+def pollPacketNetwork(size, tokens, hops):
+    # Run every machine in turn, feeding -1 to any with nothing to read,
+    # until every token has arrived
+    machines = [IntCodeMachine(packetProgram) for address in range(size)]
+    for address, machine in enumerate(machines):
+        machine.feed([address, (address - 1) % size])
+    for i in range(tokens):
+        machines[i * size // tokens].feed([hops, 0])
+
+    results = []
+    while len(results) < tokens:
+        for machine in machines:
+            if not machine.inputValues:
+                machine.feed([-1])
+            machine.execute()
+            outputs = machine.drain()
+            for destination, x, y in zip(*[iter(outputs)] * 3):
+                if destination == 255:
+                    results.append(x)
+                else:
+                    machines[destination].feed([x, y])
+    return results, sum(machine.instructionCount for machine in machines)
+
+
+def runRing(program, size, links):
+    # Stream each machine's outputs to the next, seeding the first inbox
+    scheduler = IntCodeScheduler()
+    for address in range(size):
+        scheduler.add(IntCodeMachine(program), address)
+    for source, destination in links:
+        scheduler.connect(source, destination)
+    scheduler.deliver(0, [0])
+    return scheduler.run()
+
+
+@click.command()
+@click.option("--machines", "-n", default=50)
+@click.option("--tokens", "-t", default=5)
+@click.option("--hops", "-h", default=2000)
+@click.option("--idle-after", "-i", "idleAfter", default=2)
+def main(machines, tokens, hops, idleAfter):
+    """Compare the scheduler against polling every machine in turn"""
+    runners = [
+        (
+            "scheduler",
+            lambda: runPacketNetwork(machines, tokens, hops, idleAfter),
+        ),
+        ("polling", lambda: pollPacketNetwork(machines, tokens, hops)),
+    ]
+    for name, runner in runners:
+        start = time.perf_counter()
+        results, instructions = runner()
+        elapsed = time.perf_counter() - start
+        print(
+            f"{name}: {machines} machines, {len(results)} tokens delivered,",
+            f"{instructions} instructions, {elapsed:.3f}s",
+        )
+
+    # Streamed connections, on the relay ring used by the asyncio network
+    links, fanIn = buildTopology("ring", machines)
+    program = relayProgram(fanIn, hops // 10)
+    for name, runner in [("scheduler", runRing), ("polling", runPolling)]:
+        start = time.perf_counter()
+        if name == "scheduler":
+            halted = runner(program, machines, links)
+        else:
+            halted = runner(program, machines, links, {0: 1})
+        elapsed = time.perf_counter() - start
+        print(
+            f"{name} relay ring: {machines} machines, {elapsed:.3f}s,",
+            "halted" if halted else "stalled",
+        )
+
+
+# Execute cli function on main
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,179 @@
+# stdlib imports
+import collections
+import itertools
+import math
+import time
+
+# vendor imports
+import click
+
+# local imports
+from common.intcode import IntCodeMachine
+from common.pool import IntCodePool
+from common.samples import loopProgram
+
+# Outcome of a sweep: the candidate found and the value it evaluated to, or
+# None for both if nothing matched, along with the number of candidates
+# evaluated and the time it took
+SweepResult = collections.namedtuple(
+    "SweepResult", ["candidate", "value", "evaluated", "elapsed"]
+)
+
+
+class InputSpace:
+    """Candidates for a sweep, along with how many there are if known
+
+    Any iterable of candidates can be swept directly, but one with a size
+    lets progress be reported as a fraction of the whole. Like the iterators
+    they wrap, spaces can only be swept once.
+    """
+
+    def __init__(self, candidates, size=None):
+        self.candidates = candidates
+        if size is None and hasattr(candidates, "__len__"):
+            size = len(candidates)
+        self.size = size
+
+    def __iter__(self):
+        return iter(self.candidates)
+
+    @classmethod
+    def product(cls, *ranges):
+        """Every combination of one value from each of the ranges"""
+        return cls(
+            itertools.product(*ranges),
+            math.prod(len(values) for values in ranges),
+        )
+
+    @classmethod
+    def permutations(cls, values, length=None):
+        """Every ordering of `length` of the values, defaulting to all"""
+        values = list(values)
+        return cls(
+            itertools.permutations(values, length),
+            math.perm(len(values), length),
+        )
+
+
+def sweepChunk(machine, task):
+    # Evaluate a chunk of candidates on the worker's machine, sending back
+    # just the first match or the best candidate rather than every value
+    evaluate, predicate, objective, chunk = task
+    best = None
+    for count, candidate in enumerate(chunk, 1):
+        machine.reset()
+        value = evaluate(machine, candidate)
+        if predicate is not None:
+            if predicate(value):
+                return count, (None, candidate, value)
+            continue
+        score = value if objective is None else objective(value)
+        if best is None or score > best[0]:
+            best = (score, candidate, value)
+    return len(chunk), best
+
+
+def reportProgress(evaluated, size, elapsed):
+    # Progress as a count, a fraction of the space if its size is known, and
+    # the rate candidates are being evaluated at
+    fraction = f"/{size} ({100 * evaluated / size:.1f}%)" if size else ""
+    rate = evaluated / elapsed if elapsed else 0
+    click.echo(f"swept {evaluated}{fraction}, {rate:.0f}/s", err=True)
+
+
+def sweep(
+    program,
+    space,
+    evaluate,
+    predicate=None,
+    objective=None,
+    processes=None,
+    chunkSize=64,
+    progress=None,
+    engine=IntCodeMachine,
+):
+    """Evaluate every candidate in an input space across a process pool
+
+    `evaluate(machine, candidate)` is called in a worker with a machine
+    reset to the program's image, and returns the value of the candidate.
+    It can run the machine itself or fork it into several. With a
+    `predicate`, the sweep stops at the first candidate, in the space's
+    order, whose value it accepts. Otherwise every candidate is evaluated
+    and the one whose value scores highest under `objective`, or highest
+    itself without one, wins.
+
+    Candidates are sent to the workers `chunkSize` at a time, and the
+    program is shared with them once through an IntCodePool, so it can be
+    text or an already parsed ProgramImage. Functions given have to be
+    picklable, so they must be defined at the top level of a module. With
+    `progress` set, the number of candidates evaluated and the rate are
+    reported on stderr every `progress` seconds.
+    """
+    if not isinstance(space, InputSpace):
+        space = InputSpace(space)
+
+    # Split the candidates into chunks as the pool asks for them
+    candidates = iter(space)
+    chunks = iter(lambda: list(itertools.islice(candidates, chunkSize)), [])
+    tasks = ((evaluate, predicate, objective, chunk) for chunk in chunks)
+
+    start = time.perf_counter()
+    lastReport = start
+    evaluated = 0
+    best = None
+    with IntCodePool(program, processes, engine) as pool:
+        for count, found in pool.imapCalls(sweepChunk, tasks):
+            evaluated += count
+
+            # Results come back in order, so the first match seen is the
+            # first in the space, and closing the pool abandons the rest
+            if predicate is not None:
+                if found is not None:
+                    best = found
+                    break
+            elif found is not None and (best is None or found[0] > best[0]):
+                best = found
+
+            now = time.perf_counter()
+            if progress is not None and now - lastReport >= progress:
+                reportProgress(evaluated, space.size, now - start)
+                lastReport = now
+
+    elapsed = time.perf_counter() - start
+    if progress is not None:
+        reportProgress(evaluated, space.size, elapsed)
+    if best is None:
+        return SweepResult(None, None, evaluated, elapsed)
+    return SweepResult(best[1], best[2], evaluated, elapsed)
+
+
+def sumUpTo(machine, n):
+    # Output of the loop program for one value of n
+    machine.feed([n])
+    machine.execute()
+    return machine.drain()[0]
+
+
+@click.command()
+@click.option("--size", "-n", default=5000)
+@click.option("--processes", "-p", type=int, default=None)
+@click.option("--chunk-size", "-c", "chunkSize", default=64)
+def main(size, processes, chunkSize):
+    """Sweep the loop program over a range of inputs for the biggest sum"""
+    result = sweep(
+        loopProgram,
+        InputSpace(range(size)),
+        sumUpTo,
+        processes=processes,
+        chunkSize=chunkSize,
+        progress=0.5,
+    )
+    print(
+        f"best n={result.candidate}, sum {result.value},",
+        f"{result.evaluated / result.elapsed:.0f} candidates/s",
+    )
+
+
+# Execute cli function on main
+if __name__ == "__main__":
+    main()
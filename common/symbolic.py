@@ -0,0 +1,397 @@
+# stdlib imports
+import collections
+import itertools
+import math
+import time
+
+# vendor imports
+import click
+
+# local imports
+from common.intcode import (
+    IntCodeMachineState,
+    decodeTable,
+    loadImage,
+    parameterCounts,
+)
+
+
+class SymbolicExecutionError(RuntimeError):
+    """A program needed to know what a symbolic value actually is"""
+
+
+class UnknownValue:
+    """Value read from memory through a symbolic address
+
+    It can't be pinned down, but it's harmless until something uses it, so
+    arithmetic on it just gives another unknown value.
+    """
+
+    def __add__(self, other):
+        return self
+
+    __radd__ = __add__
+
+    def __mul__(self, other):
+        return 0 if other == 0 else self
+
+    __rmul__ = __mul__
+
+    def __repr__(self):
+        return "?"
+
+
+# The single unknown value
+unknown = UnknownValue()
+
+
+class Expression:
+    """Polynomial in named variables with integer coefficients
+
+    Terms map each monomial, the sorted tuple of variables multiplied
+    together, to its coefficient, with the constant term under the empty
+    tuple. Arithmetic that cancels every variable out gives back a plain
+    int, so concrete values stay ints throughout.
+    """
+
+    def __init__(self, terms):
+        self.terms = terms
+
+    @classmethod
+    def variable(cls, name):
+        """Expression of a single variable"""
+        return cls({(name,): 1})
+
+    @staticmethod
+    def build(terms):
+        # Drop cancelled terms, and collapse constants to plain ints
+        terms = {
+            monomial: coefficient
+            for monomial, coefficient in terms.items()
+            if coefficient
+        }
+        if not any(terms):
+            return terms.get((), 0)
+        return Expression(terms)
+
+    @staticmethod
+    def termsOf(value):
+        # Terms of an expression or a plain int
+        if isinstance(value, Expression):
+            return value.terms
+        return {(): value}
+
+    def __add__(self, other):
+        if other is unknown:
+            return NotImplemented
+        terms = dict(self.terms)
+        for monomial, coefficient in Expression.termsOf(other).items():
+            terms[monomial] = terms.get(monomial, 0) + coefficient
+        return Expression.build(terms)
+
+    __radd__ = __add__
+
+    def __mul__(self, other):
+        if other is unknown:
+            return NotImplemented
+        terms = dict()
+        pairs = itertools.product(
+            self.terms.items(), Expression.termsOf(other).items()
+        )
+        for (monomialA, coefficientA), (monomialB, coefficientB) in pairs:
+            monomial = tuple(sorted(monomialA + monomialB))
+            terms[monomial] = (
+                terms.get(monomial, 0) + coefficientA * coefficientB
+            )
+        return Expression.build(terms)
+
+    __rmul__ = __mul__
+
+    def __eq__(self, other):
+        return isinstance(other, Expression) and self.terms == other.terms
+
+    def __hash__(self):
+        return hash(frozenset(self.terms.items()))
+
+    def __repr__(self):
+        # Highest degree terms first, like "2*x*y + 3*x + 7"
+        parts = []
+        for monomial, coefficient in sorted(
+            self.terms.items(), key=lambda term: (-len(term[0]), term[0])
+        ):
+            factors = list(monomial)
+            if coefficient != 1 or not factors:
+                factors.insert(0, str(coefficient))
+            parts.append("*".join(factors))
+        return " + ".join(parts).replace("+ -", "- ")
+
+    @property
+    def variables(self):
+        """Names of the variables in the expression, sorted"""
+        return sorted(set(itertools.chain(*self.terms)))
+
+    @property
+    def degree(self):
+        """Highest number of variables multiplied together in any term"""
+        return max(len(monomial) for monomial in self.terms)
+
+    def degreeIn(self, name):
+        """Highest power of one variable in any term"""
+        return max(monomial.count(name) for monomial in self.terms)
+
+    def split(self, name):
+        """Split a linear variable out as `coefficient * name + rest`
+
+        Returns `(coefficient, rest)`, neither of which holds the variable.
+        """
+        coefficient = dict()
+        rest = dict()
+        for monomial, value in self.terms.items():
+            if name in monomial:
+                reduced = list(monomial)
+                reduced.remove(name)
+                coefficient[tuple(reduced)] = value
+            else:
+                rest[monomial] = value
+        return Expression.build(coefficient), Expression.build(rest)
+
+
+def evaluate(value, values):
+    """Value of an expression or int with its variables set to `values`"""
+    if not isinstance(value, Expression):
+        return value
+    return sum(
+        coefficient * math.prod(values[name] for name in monomial)
+        for monomial, coefficient in value.terms.items()
+    )
+
+
+def solve(value, target, ranges):
+    """Yield every assignment of variables for which `value` equals `target`
+
+    `ranges` maps the name of every variable to the values it can take, and
+    assignments are yielded as dicts, ordered like `itertools.product` over
+    them. When the expression is linear in the last variable, that one is
+    solved for with a division for each combination of the others, so a
+    linear expression in two variables takes one pass over the first range.
+    Anything else is evaluated for every combination, which is still far
+    cheaper than running the program for each.
+    """
+    if value is unknown:
+        raise SymbolicExecutionError("Value depends on an unknown read")
+    names = list(ranges)
+
+    # Solving for the last variable keeps the assignments in product order,
+    # as the others are then enumerated in the same order as the product
+    solved = names[-1] if names else None
+    if not isinstance(value, Expression) or value.degreeIn(solved) != 1:
+        for combination in itertools.product(*ranges.values()):
+            values = dict(zip(names, combination))
+            if evaluate(value, values) == target:
+                yield values
+        return
+    coefficient, rest = value.split(solved)
+    others = names[:-1]
+
+    for combination in itertools.product(*(ranges[name] for name in others)):
+        values = dict(zip(others, combination))
+        scale = evaluate(coefficient, values)
+        remainder = target - evaluate(rest, values)
+
+        # With no coefficient left, either any value works or none does
+        if scale == 0:
+            candidates = ranges[solved] if remainder == 0 else []
+        else:
+            quotient, modulus = divmod(remainder, scale)
+            candidates = (
+                [quotient]
+                if modulus == 0 and quotient in ranges[solved]
+                else []
+            )
+        for candidate in candidates:
+            yield {
+                name: candidate if name == solved else values[name]
+                for name in names
+            }
+
+
+class SymbolicIntCodeMachine:
+    """IntCode machine whose memory can hold expressions as well as values
+
+    The memory cells given as `variables`, a dict of addresses to names,
+    start out holding a variable of that name, and additions and
+    multiplications build up expressions of them. Anything that needs to
+    know what a symbolic value actually is, like a jump or comparison on it,
+    writing through it as an address or overwriting code with it, raises a
+    SymbolicExecutionError, so the caller can fall back to running the
+    program concretely. Reading through a symbolic address gives an unknown
+    value instead, which is only an error once something depends on it.
+    Input values are concrete and fed as usual.
+    """
+
+    def __init__(self, instructions, variables):
+        image = loadImage(instructions)
+        self.memory = dict(enumerate(image.memory[: len(image)]))
+        for address, name in variables.items():
+            self.memory[address] = Expression.variable(name)
+
+        # Queues of input values waiting to be read and captured outputs
+        self.inputValues = collections.deque()
+        self.outputValues = collections.deque()
+
+        # Starting register values
+        self.state = IntCodeMachineState.CLEAN
+        self.position = 0
+        self.relativeBase = 0
+        self.instructionCount = 0
+
+    def feed(self, values):
+        """Queue up any number of input values"""
+        self.inputValues.extend(values)
+
+    def drain(self):
+        """Remove and return all the output values captured so far"""
+        values = list(self.outputValues)
+        self.outputValues.clear()
+        return values
+
+    def concrete(self, value, use):
+        # Values that decide what the program does next can't be symbolic
+        if isinstance(value, (Expression, UnknownValue)):
+            raise SymbolicExecutionError(
+                f"Symbolic {use} {value} at position {self.position}"
+            )
+        return value
+
+    def address(self, offset, mode):
+        # Address a position or relative mode param at `offset` refers to
+        address = self.concrete(
+            self.memory.get(self.position + offset, 0), "address"
+        )
+        if mode == 2:
+            address += self.relativeBase
+        if address < 0:
+            raise RuntimeError("Negative memory address")
+        return address
+
+    def readParam(self, offset, mode):
+        param = self.memory.get(self.position + offset, 0)
+        if mode == 1:
+            return param
+
+        # Reading through a symbolic address gives an unknown value, which
+        # only matters if it's used
+        if isinstance(param, (Expression, UnknownValue)):
+            return unknown
+        return self.memory.get(self.address(offset, mode), 0)
+
+    def writeParam(self, offset, mode, value):
+        self.memory[self.address(offset, mode)] = value
+
+    def execute(self, maxSteps=10_000_000):
+        """Run until the machine halts or runs out of input
+
+        A program still running after `maxSteps` instructions raises a
+        SymbolicExecutionError rather than running forever.
+        """
+        if self.state is IntCodeMachineState.HALTED:
+            raise RuntimeError("Machine is already halted")
+
+        for _ in range(maxSteps):
+            # Decode the current instruction, which has to be concrete
+            instruction = self.concrete(
+                self.memory.get(self.position, 0), "opcode"
+            )
+            decoded = decodeTable.get(instruction)
+            if decoded is None:
+                raise RuntimeError(
+                    f"Unknown opcode {instruction % 100} ({instruction}) at position {self.position}"
+                )
+            opcode, *modes = decoded
+            step = 1 + parameterCounts[opcode]
+
+            # Code 1 and 2 build up expressions
+            if opcode in (1, 2):
+                a = self.readParam(1, modes[0])
+                b = self.readParam(2, modes[1])
+                self.writeParam(3, modes[2], a + b if opcode == 1 else a * b)
+
+            # Code 3 and 4 are input and output
+            elif opcode == 3:
+                if not self.inputValues:
+                    self.state = IntCodeMachineState.WAITING_FOR_INPUT
+                    return
+                self.writeParam(1, modes[0], self.inputValues.popleft())
+            elif opcode == 4:
+                self.outputValues.append(self.readParam(1, modes[0]))
+
+            # Code 5 and 6 are jumps on a concrete condition
+            elif opcode in (5, 6):
+                condition = self.concrete(
+                    self.readParam(1, modes[0]), "condition"
+                )
+                if (condition != 0) == (opcode == 5):
+                    self.position = self.concrete(
+                        self.readParam(2, modes[1]), "jump target"
+                    )
+                    self.instructionCount += 1
+                    continue
+
+            # Code 7 and 8 compare concrete values
+            elif opcode in (7, 8):
+                a = self.concrete(self.readParam(1, modes[0]), "comparison")
+                b = self.concrete(self.readParam(2, modes[1]), "comparison")
+                self.writeParam(
+                    3, modes[2], int(a < b if opcode == 7 else a == b)
+                )
+
+            # Code 9 moves the relative base by a concrete amount
+            elif opcode == 9:
+                self.relativeBase += self.concrete(
+                    self.readParam(1, modes[0]), "relative base"
+                )
+
+            # Code 99 halts
+            else:
+                self.state = IntCodeMachineState.HALTED
+                self.instructionCount += 1
+                return
+
+            self.position += step
+            self.instructionCount += 1
+
+        raise SymbolicExecutionError(
+            f"Still running after {maxSteps} instructions"
+        )
+
+
+@click.command()
+@click.argument("input_file", type=click.File("r"))
+@click.option("--target", "-t", type=int, required=True)
+@click.option("--cell", "-c", "cells", type=int, multiple=True, default=[1, 2])
+@click.option("--result", "-r", default=0)
+@click.option("--limit", "-l", default=100)
+def main(input_file, target, cells, result, limit):
+    """Solve for the values of memory cells that give a target result"""
+    # Run the program once with every cell symbolic
+    start = time.perf_counter()
+    machine = SymbolicIntCodeMachine(
+        input_file.read(), {cell: f"m{cell}" for cell in cells}
+    )
+    machine.execute()
+    expression = machine.memory.get(result, 0)
+    print(f"m{result} = {expression}")
+
+    # Then solve it for the target, with every cell below the limit
+    solutions = list(
+        solve(expression, target, {f"m{cell}": range(limit) for cell in cells})
+    )
+    print(
+        f"{len(solutions)} solutions in {time.perf_counter() - start:.3f}s:",
+        solutions[:10],
+    )
+
+
+# Execute cli function on main
+if __name__ == "__main__":
+    main()
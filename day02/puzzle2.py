@@ -1,89 +1,65 @@
 # stdlib imports
-import copy
+import functools
+import operator
 
 # vendor imports
 import click
 
+# local imports
+from common.sweep import InputSpace, sweep
+from common.symbolic import (
+    SymbolicExecutionError,
+    SymbolicIntCodeMachine,
+    solve,
+)
+
+
+def runNounVerb(machine, candidate):
+    # Inject the noun and verb, then run to the end and read the result
+    machine.memory[1], machine.memory[2] = candidate
+    machine.execute()
+    return machine.memory[0]
+
+
+def search(program, target, processes):
+    """Run every noun and verb until one gives the target"""
+    # Sweep the combinations in order across a pool of processes sharing the
+    # program, stopping at the first that hits the target
+    result = sweep(
+        program,
+        InputSpace.product(range(100), range(100)),
+        runNounVerb,
+        predicate=functools.partial(operator.eq, target),
+        processes=processes,
+    )
+    return result.candidate
+
 
 @click.command()
 @click.argument("input_file", type=click.File("r"))
-def main(input_file):
+@click.option("--processes", "-p", type=int, default=None)
+def main(input_file, processes):
     """Put your puzzle execution code here"""
-    # Convert the comma-delimited string of numbers into a list of ints
-    masterRegister = list(
-        map(lambda op: int(op), input_file.read().strip().split(","))
-    )
-
-    def execute(noun, verb):
-        # Create a local copy of the register for this execution
-        register = copy.deepcopy(masterRegister)
-
-        # Inject the noun and verb
-        register[1] = noun
-        register[2] = verb
-
-        # We will start reading the opcodes at position 0
-        pointer = 0
-
-        # Loop infinitely until we reach the termination instruction
-        while True:
-            # Get the code at the current read position
-            code = register[pointer]
-
-            # Code 99 means immediate termination
-            if code == 99:
-                break
-
-            # Code 1 is addition
-            elif code == 1:
-                # Get register addresses
-                addendAPointer = register[pointer + 1]
-                addendBPointer = register[pointer + 2]
-                sumPointer = register[pointer + 3]
-
-                # Perform the addition
-                register[sumPointer] = (
-                    register[addendAPointer] + register[addendBPointer]
-                )
-
-                # Advance the code position by 4
-                pointer += 4
-
-            # Code 2 is multiplication
-            elif code == 2:
-                # Get register addresses
-                factorAPointer = register[pointer + 1]
-                factorBPointer = register[pointer + 2]
-                productPointer = register[pointer + 3]
-
-                # Perform the addition
-                register[productPointer] = (
-                    register[factorAPointer] * register[factorBPointer]
-                )
-
-                # Advance the code position by 4
-                pointer += 4
-
-            # Unknown opcode means there was an error
-            else:
-                raise RuntimeError(
-                    f"Unknown opcode {code} at position {pointer}"
-                )
-
-        # Return the result
-        return register[0]
-
-    # Iterate through all the possible combinations until the target is found
+    program = input_file.read()
     target = 19690720
-    found = None
-    for noun in range(100):
-        for verb in range(100):
-            result = execute(noun, verb)
-            if result == target:
-                found = (noun, verb)
-                break
-        if found:
-            break
+
+    # Run the program once with the noun and verb as variables, and solve
+    # the expression it leaves as the result for the target. Programs that
+    # can't be run that way are searched by running them concretely.
+    try:
+        machine = SymbolicIntCodeMachine(program, {1: "noun", 2: "verb"})
+        machine.execute()
+        solution = next(
+            solve(
+                machine.memory.get(0, 0),
+                target,
+                {"noun": range(100), "verb": range(100)},
+            ),
+            None,
+        )
+        found = solution and (solution["noun"], solution["verb"])
+    except SymbolicExecutionError:
+        found = search(program, target, processes)
 
     # Calculate the final result
     print("RESULT:", 100 * found[0] + found[1])
@@ -1,185 +1,42 @@
-# stdlib imports
-import itertools
-
 # vendor imports
 import click
 
+# local imports
+from common.intcode import ProgramImage
+from common.sweep import InputSpace, sweep
 
-# Recursive function to split a decimal into digits
-def getDigits(n):
-    if n < 10:
-        return [n]
-    else:
-        r = getDigits(n // 10)
-        return r + [n % 10]
-
-
-def splitInstruction(n):
-    # Split the instruction into digits and reverse them
-    digits = list(reversed(getDigits(n)))
-
-    # Zero fill the digits array
-    for i in range(5 - len(digits)):
-        digits.append(0)
-
-    # Consolidate the ones and tens place into an opcode
-    opcode = digits[0] + 10 * digits[1]
-
-    # Return the opcode and param modes
-    return (opcode, digits[2], digits[3], digits[4])
-
-
-def resolveValue(memory, param, paramMode):
-    # If in immediate mode, return the value directly
-    if paramMode == 1:
-        return param
-
-    # Else, treat it as a pointer
-    else:
-        return memory[param]
-
-
-def executeIntCode(instructions, inputValues=[]):
-    # Convert the comma-delimited string of numbers into a list of ints
-    memory = list(map(lambda op: int(op), instructions.strip().split(",")))
-
-    # Empty list to capture output values
-    outputValues = []
-
-    # We will start reading the opcodes at position 0
-    position = 0
-
-    # Loop infinitely until we reach the termination instruction
-    while True:
-        # Get the code at the current read position
-        instruction = memory[position]
-
-        # Split the opcode and params apart
-        opcode, paramModeA, paramModeB, paramModeC = splitInstruction(
-            instruction
-        )
-
-        # Code 99 means immediate termination
-        if opcode == 99:
-            break
-
-        # Code 1 is addition
-        elif opcode == 1:
-            # Get memory values
-            paramA = resolveValue(memory, memory[position + 1], paramModeA)
-            paramB = resolveValue(memory, memory[position + 2], paramModeB)
-            sumPointer = memory[position + 3]
-
-            # print("ADD", paramA, paramB, "->", sumPointer)
-
-            # Perform the addition
-            memory[sumPointer] = paramA + paramB
 
-            # Advance the code position by 4
-            position += 4
-
-        # Code 2 is multiplication
-        elif opcode == 2:
-            # Get memory values
-            paramA = resolveValue(memory, memory[position + 1], paramModeA)
-            paramB = resolveValue(memory, memory[position + 2], paramModeB)
-            productPointer = memory[position + 3]
-
-            # Perform the addition
-            memory[productPointer] = paramA * paramB
-
-            # Advance the code position by 4
-            position += 4
-
-        # Code 3 is input
-        elif opcode == 3:
-            # Prompt the user for input
-            try:
-                value = inputValues.pop(0)
-            except IndexError:
-                raise RuntimeError("Not enough input values provided!")
-
-            # Store the value at the indicated pointer position
-            outPointer = memory[position + 1]
-            memory[outPointer] = value
-
-            # Advance the code position
-            position += 2
-
-        # Code 4 is output
-        elif opcode == 4:
-            # Determine the value and print it
-            value = resolveValue(memory, memory[position + 1], paramModeA)
-            outputValues.append(value)
-
-            # Advance the code position
-            position += 2
-
-        # Code 5 and 6 are conditional jumps
-        elif opcode in [5, 6]:
-            # Get memory values
-            paramA = resolveValue(memory, memory[position + 1], paramModeA)
-            paramB = resolveValue(memory, memory[position + 2], paramModeB)
-
-            # If non-zero, set the position pointer
-            if (opcode == 5 and paramA != 0) or (opcode == 6 and paramA == 0):
-                position = paramB
-
-            # Else, do nothing and advance the position naturally
-            else:
-                position += 3
-
-        # Code 7 and 8 are comparison
-        elif opcode in [7, 8]:
-            # Get memory values
-            paramA = resolveValue(memory, memory[position + 1], paramModeA)
-            paramB = resolveValue(memory, memory[position + 2], paramModeB)
-            outputPointer = memory[position + 3]
-
-            # Determine the value based on the opcode
-            if opcode == 7:
-                flag = paramA < paramB
-            elif opcode == 8:
-                flag = paramA == paramB
-
-            # Write the value to memory
-            memory[outputPointer] = int(flag)
-
-            # Advance the code position by 4
-            position += 4
-
-        # Unknown opcode means there was an error
-        else:
-            raise RuntimeError(
-                f"Unknown opcode {opcode} ({instruction}) at position {position}"
-            )
-
-    # Return output values
-    return outputValues
+def amplify(machine, phases):
+    # Run the signal through each amplifier in turn, reusing the one machine
+    signal = 0
+    for phase in phases:
+        machine.reset()
+        machine.feed([phase, signal])
+        machine.execute()
+        signal = machine.drain()[0]
+    return signal
 
 
 @click.command()
 @click.argument("input_file", type=click.File("r"))
-def main(input_file):
+@click.option("--processes", "-p", type=int, default=None)
+def main(input_file, processes):
     """Put your puzzle execution code here"""
-    # Load the amplifier software instructions
-    amplifierSoftware = input_file.read().strip()
-
-    # List to catch all output signals
-    outputSignals = []
-
-    # Iterate through all permutations of phase signals
-    for permutation in itertools.permutations(range(5)):
-        # Run phase signals through each amplifier sequentially
-        previousValue = 0
-        for phase in permutation:
-            previousValue = executeIntCode(
-                amplifierSoftware, [phase, previousValue]
-            )[0]
-        outputSignals.append(previousValue)
+    # Load the amplifier software instructions, parsing them just once
+    amplifierSoftware = ProgramImage(input_file.read())
+
+    # Sweep every permutation of phase signals across a pool of processes
+    # for the highest output signal
+    result = sweep(
+        amplifierSoftware,
+        InputSpace.permutations(range(5)),
+        amplify,
+        processes=processes,
+        chunkSize=8,
+    )
 
     # Result is the highest output signal
-    print("RESULT:", max(outputSignals))
+    print("RESULT:", result.value)
 
 
 # Execute cli function on main
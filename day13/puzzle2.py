@@ -1,6 +1,7 @@
 # stdlib imports
 import enum
 import math
+import os
 import sys
 import time
 
@@ -10,6 +11,7 @@ import click
 # local imports
 from common.intcode import IntCodeMachine, IntCodeMachineState
 from common.iteration import every
+from common.journal import IoJournal, JournaledIntCodeMachine
 
 
 class TileType(enum.Enum):
@@ -29,111 +31,153 @@ tileCharacters = {
 }
 
 
+class ArcadeScreen:
+    """The arcade's screen, updated one drawn tile at a time"""
+
+    def __init__(self):
+        self.board = dict()
+        self.xMax = 0
+        self.yMax = 0
+        self.score = 0
+        self.ballX = 0
+        self.paddleX = 0
+        self.blocks = 0
+
+    def draw(self, frame):
+        x, y, tileId = frame
+
+        # x -1 and y 0 are the signals for the score output
+        if x == -1 and y == 0:
+            self.score = tileId
+            return
+
+        tile = TileType(tileId)
+
+        # Track ball and paddle position
+        if tile is TileType.BALL:
+            self.ballX = x
+        elif tile is TileType.PADDLE:
+            self.paddleX = x
+
+        # Keep count of the blocks as they're drawn and broken
+        if self.board.get((x, y)) is TileType.BLOCK:
+            self.blocks -= 1
+        if tile is TileType.BLOCK:
+            self.blocks += 1
+
+        self.board[(x, y)] = tile
+        self.xMax = max(self.xMax, x)
+        self.yMax = max(self.yMax, y)
+
+
 @click.command()
 @click.argument("input_file", type=click.File("r"))
 @click.option("--user-control", "-u", is_flag=True)
 @click.option("--visualize", "-v", is_flag=True)
-def main(input_file, user_control, visualize):
+@click.option(
+    "--journal", "-j", "journalPath", type=click.Path(dir_okay=False)
+)
+def main(input_file, user_control, visualize, journalPath):
     print("WARNING: This may take a while")
 
     # Load program from input file
     arcadeProgram = input_file.read().strip()
 
-    # Create a new intcode machine, add quarters, and execute
-    machine = IntCodeMachine(arcadeProgram)
-    machine.memory[0] = 2  # 2 quarters
-
-    # Loop until all blocks are broken
-    blocks = math.inf
-    while blocks > 0:
-        # Execute machine until next interrupt
-        machine.execute()
-
-        # Iterate through output values to construct tiles and read score
-        board = dict()
-        xMax = 0
-        yMax = 0
-        score = 0
-        ballX = 0
-        paddleX = 0
-        for x, y, tileId in every(machine.outputValues, 3):
-            # x -1 and y 0 are the signals for the score output
-            if x == -1 and y == 0:
-                score = tileId
-                continue
-
-            tile = TileType(tileId)
-
-            # Track ball and paddle position
-            if tile is TileType.BALL:
-                ballX = x
-            elif tile is TileType.PADDLE:
-                paddleX = x
-
-            board[(x, y)] = tile
-            xMax = max(xMax, x)
-            yMax = max(yMax, y)
-
-        # Update block count
-        blocks = len(
-            list(filter(lambda item: item[1] is TileType.BLOCK, board.items()))
+    # With a journal, pick the session up where it was left and redraw
+    # everything drawn so far, or record a new one
+    screen = ArcadeScreen()
+    if journalPath is not None and os.path.exists(journalPath):
+        machine = JournaledIntCodeMachine.replay(
+            arcadeProgram, IoJournal.load(journalPath)
         )
-
-        # Draw the board to the console if visualize flag enabled
-        if visualize:
-            print("CURRENT SCORE:", score)
-            for y in range(yMax + 1):
-                for x in range(xMax + 1):
-                    sys.stdout.write(tileCharacters[board[(x, y)]])
-                sys.stdout.write("\n")
-            print()
-
-        # If the game is waiting on input, get the key from console
-        if machine.state is IntCodeMachineState.WAITING_FOR_INPUT:
-            # If user control is activated, let the user controll the paddle
-            if user_control:
-                while True:
-                    button = click.getchar()
-                    if button == "a":
-                        button = -1
-                        break
-                    elif button == "d":
-                        button = 1
-                        break
-                    elif button == " ":
-                        button = 0
-                        break
-                    print("INVALID INPUT!")
-                machine.inputValue = button
-
-            # Else, track the ball with the paddle
-            else:
-                if ballX < paddleX:
-                    machine.inputValue = -1
-                elif ballX > paddleX:
-                    machine.inputValue = 1
+        for frame in every(machine.journal.outputs, 3):
+            screen.draw(frame)
+        machine.outputValues.clear()
+
+    # Else create a new intcode machine, add quarters, and execute
+    else:
+        if journalPath is not None:
+            machine = JournaledIntCodeMachine(arcadeProgram)
+        else:
+            machine = IntCodeMachine(arcadeProgram)
+        machine.memory[0] = 2  # 2 quarters
+
+    # Tiles are drawn to the screen as the game outputs them, rather than
+    # piling up in the machine
+    machine.connectOutput(screen.draw, 3)
+
+    try:
+        # Loop until all blocks are broken
+        blocks = math.inf
+        while blocks > 0:
+            # Execute machine until next interrupt, unless a resumed
+            # session had already finished
+            if machine.state is not IntCodeMachineState.HALTED:
+                machine.execute()
+            blocks = screen.blocks
+            score = screen.score
+
+            # Draw the board to the console if visualize flag enabled
+            if visualize:
+                print("CURRENT SCORE:", score)
+                for y in range(screen.yMax + 1):
+                    for x in range(screen.xMax + 1):
+                        sys.stdout.write(tileCharacters[screen.board[(x, y)]])
+                    sys.stdout.write("\n")
+                print()
+
+            # If the game is waiting on input, get the key from console
+            if machine.state is IntCodeMachineState.WAITING_FOR_INPUT:
+                # If user control is activated, let the user control the
+                # paddle
+                if user_control:
+                    while True:
+                        button = click.getchar()
+                        if button == "a":
+                            button = -1
+                            break
+                        elif button == "d":
+                            button = 1
+                            break
+                        elif button == " ":
+                            button = 0
+                            break
+                        print("INVALID INPUT!")
+                    machine.inputValue = button
+
+                # Else, track the ball with the paddle
                 else:
-                    machine.inputValue = 0
-
-                # If visualizing, artificially slow down execution
-                if visualize:
-                    time.sleep(0.001)
-
-        # Handle halt state
-        elif machine.state is IntCodeMachineState.HALTED:
-            # If there are blocks left, you lose
-            if blocks > 0:
-                print("YOU LOSE")
-                break
+                    if screen.ballX < screen.paddleX:
+                        machine.inputValue = -1
+                    elif screen.ballX > screen.paddleX:
+                        machine.inputValue = 1
+                    else:
+                        machine.inputValue = 0
+
+                    # If visualizing, artificially slow down execution
+                    if visualize:
+                        time.sleep(0.001)
+
+            # Handle halt state
+            elif machine.state is IntCodeMachineState.HALTED:
+                # If there are blocks left, you lose
+                if blocks > 0:
+                    print("YOU LOSE")
+                    break
+
+                # Else, you win. Print the final score.
+                else:
+                    print("RESULT:", score)
+                    break
 
-            # Else, you win. Print the final score.
+            # Invalid state????
             else:
-                print("RESULT:", score)
-                break
+                raise RuntimeError(f"Invalid machine state: {machine.state}")
 
-        # Invalid state????
-        else:
-            raise RuntimeError(f"Invalid machine state: {machine.state}")
+    # Keep the session so it can be picked up again later
+    finally:
+        if journalPath is not None:
+            machine.journal.save(journalPath)
 
 
 # Execute cli function on main